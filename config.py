@@ -19,7 +19,11 @@ DEFAULT_CONFIG = {
 
     # Filters
     "enable_macro_filter": True,      # Bond Yield Filter (Effective)
-    "enable_northbound_filter": False # Northbound Filter (Reduced returns in backtest)
+    "enable_northbound_filter": False, # Northbound Filter (Reduced returns in backtest)
+
+    # Signal Windows (override by column name, e.g. {"ma20": 30, "pe_rank_5y": 2500})
+    # Empty = defaults declared in factors.py
+    "signal_windows": {}
 }
 
 class StrategyConfig:
@@ -0,0 +1,53 @@
+import pandas as pd
+
+# Run Constraints
+# Declarative limits checked bar by bar while a backtest steps. The first violation
+# stops the run; it is then reported as pruned with the reason and the bar.
+
+
+class RunConstraints:
+    def __init__(self, max_drawdown=None, min_fills=None, min_fills_by=None, min_equity=None):
+        """
+        Args:
+            max_drawdown (float): Max drawdown in percent (e.g. 30 for 30%).
+            min_fills (int): Minimum executed orders (buys + sells, not round trips) ...
+            min_fills_by (str): ... required by this date (YYYY-MM-DD).
+            min_equity (float): Portfolio value floor.
+        """
+        self.max_drawdown = max_drawdown
+        self.min_fills = min_fills
+        self.min_fills_by = pd.Timestamp(min_fills_by) if min_fills_by else None
+        self.min_equity = min_equity
+
+    def check(self, date, value, peak, fills):
+        """Returns the violation reason, or None if the run may continue."""
+        if self.max_drawdown is not None and peak > 0:
+            dd = (peak - value) / peak * 100
+            if dd > self.max_drawdown:
+                return f"Max drawdown {dd:.2f}% > {self.max_drawdown:.2f}%"
+
+        if self.min_equity is not None and value < self.min_equity:
+            return f"Equity {value:.2f} < {self.min_equity:.2f}"
+
+        if self.min_fills is not None and self.min_fills_by is not None:
+            if pd.Timestamp(date) >= self.min_fills_by and fills < self.min_fills:
+                return f"Only {fills} fills by {self.min_fills_by.date()} (< {self.min_fills})"
+
+        return None
+
+    def to_dict(self):
+        """Plain dict (part of the archive key / queue task of constrained runs)."""
+        return {
+            'max_drawdown': self.max_drawdown,
+            'min_fills': self.min_fills,
+            'min_fills_by': str(self.min_fills_by.date()) if self.min_fills_by is not None else None,
+            'min_equity': self.min_equity,
+        }
+
+    def is_empty(self):
+        return self.max_drawdown is None and self.min_equity is None and (
+            self.min_fills is None or self.min_fills_by is None)
+
+
+def pruned_info(reason, date, bar):
+    return {'reason': reason, 'date': str(pd.Timestamp(date).date()), 'bar': int(bar)}
@@ -8,18 +8,35 @@ from main import load_state
 import json
 import os
 from config import StrategyConfig
-from decision_engine import DecisionEngine
+import sensitivity
+import performance_tracker
+from signal_service import SignalClient
 
 # Set Page Config
 st.set_page_config(page_title="ChiNext 助手", layout="wide", page_icon="🤖")
 
 # --- Helper Functions ---
+@st.cache_resource
+def signal_client():
+    """One client per process: ETag revalidation and the local fallback cache persist across reruns"""
+    return SignalClient()
+
+# Cached results are keyed by data version, so a data update only invalidates
+# entries whose underlying data actually changed.
 @st.cache_data
-def load_market_data():
-    """Load data efficiently"""
-    df = signal_calculator.load_data()
-    df = signal_calculator.calculate_signals(df)
-    return df
+def load_market_data(version, windows):
+    """Load data efficiently (`version` is the current data version, used as cache key)"""
+    # Served by the local signal service when running (computed locally otherwise)
+    return signal_client().history()
+
+@st.cache_data(ttl=60) # Surface may be built in the background meanwhile
+def load_surface(version, base_hash):
+    return sensitivity.load_surface(version, base_hash)
+
+@st.cache_data
+def load_performance(version, params):
+    """Live-to-date strategy track record (incremental, see performance_tracker.py)"""
+    return performance_tracker.update_performance(signal_calculator.load_data(), params)
 
 def update_config(key, value):
     config = StrategyConfig()
@@ -33,7 +50,7 @@ if st.sidebar.button("🔄 立即更新数据"):
     with st.spinner("正在连接 AkShare 更新数据..."):
         try:
             data_loader.update_database()
-            st.cache_data.clear()
+            signal_client().refresh()
             st.success("数据已更新到最新！")
         except Exception as e:
             st.error(f"更新失败: {e}")
@@ -78,7 +95,8 @@ st.title("🤖 创业板指 (399006) 智能助理")
 
 # 1. Load Data
 try:
-    df = load_market_data()
+    data_version = signal_calculator.current_version()
+    df = load_market_data(data_version, StrategyConfig().get('signal_windows'))
     latest = df.iloc[-1]
 except Exception as e:
     st.warning("暂无数据，请点击左侧 '立即更新数据' 按钮。")
@@ -92,18 +110,7 @@ last_buy_price = state.get("last_buy_price")
 # 3. Decision Engine
 st.markdown("### 📢 当前决策建议")
 
-engine = DecisionEngine(config)
-data_dict = {
-    'price': latest['close'],
-    'pe_rank_5y': latest['pe_rank_5y'],
-    'vol_ratio': latest['vol_ratio'],
-    'bias_20': latest['bias_20'],
-    'ma60': latest['ma60'],
-    'bond_trend_down': latest['bond_trend_down'],
-    'north_inflow_20': latest['north_inflow_20']
-}
-
-decision, reason = engine.analyze(data_dict, len(positions), last_buy_price)
+decision, reason = signal_client().decision(len(positions), last_buy_price)
 
 # Translate Decision to UI
 status_color = "grey"
@@ -181,7 +188,58 @@ with tab2:
     fig_pe.update_layout(height=400, margin=dict(l=0, r=0, t=30, b=0))
     st.plotly_chart(fig_pe, use_container_width=True) # Fixed warning
 
-# 6. Backtest
+# 6. Live-to-date Performance
+st.markdown("---")
+st.subheader("📈 策略跟踪表现 (2018 至今)")
+try:
+    perf = load_performance(data_version, StrategyConfig().params)
+    p1, p2, p3, p4 = st.columns(4)
+    p1.metric("夏普比率", f"{perf['sharpe']:.2f}")
+    p2.metric("累计收益", f"{perf['return']:.1%}")
+    p3.metric("最大回撤", f"{perf['drawdown']:.1f}%")
+    p4.metric("交易次数", f"{perf['trades']}")
+    st.line_chart(perf['equity'], height=250)
+    st.caption(f"截至 {perf['as_of']}")
+except Exception as e:
+    st.warning(f"跟踪表现计算失败: {e}")
+
+# 7. Parameter Sensitivity (precomputed surface)
+st.markdown("---")
+st.subheader("🧭 参数敏感度")
+current_params = {
+    'buy_pe_threshold': buy_pe,
+    'buy_vol_threshold': buy_vol,
+    'grid_drop_pct': grid_drop,
+    'enable_macro_filter': enable_macro,
+    'enable_northbound_filter': enable_nb,
+}
+surface = load_surface(data_version, sensitivity.base_config_hash(StrategyConfig().params))
+
+if surface.empty:
+    st.info("当前数据/配置尚无预计算结果。点击下方按钮在后台生成 (不阻塞看板)。")
+else:
+    point = sensitivity.lookup(surface, current_params)
+    if point:
+        s1, s2, s3, s4 = st.columns(4)
+        s1.metric("夏普比率", f"{point['sharpe']:.2f}" if pd.notna(point['sharpe']) else "—")
+        s2.metric("策略收益", f"{point['return']:.1%}")
+        s3.metric("最大回撤", f"{point['drawdown']:.1f}%")
+        s4.metric("交易次数", f"{point['trades']:.0f}")
+
+    hm_metric = st.selectbox("热力图指标", sensitivity.METRICS, index=0)
+    hm = sensitivity.heatmap(surface, current_params, metric=hm_metric)
+    if not hm.empty:
+        fig_hm = go.Figure(go.Heatmap(z=hm.values, x=hm.columns, y=hm.index, colorscale='RdYlGn'))
+        fig_hm.add_trace(go.Scatter(x=[buy_pe], y=[buy_vol], mode='markers', marker=dict(color='black', size=12, symbol='x'), name='当前参数'))
+        fig_hm.update_layout(height=400, xaxis_title='PE Rank 买入阈值', yaxis_title='Vol Ratio 买入阈值', margin=dict(l=0, r=0, t=30, b=0))
+        st.plotly_chart(fig_hm, use_container_width=True)
+
+if st.button("⚙️ 后台预计算参数网格"):
+    sensitivity.start_background_build()
+    load_surface.clear()
+    st.success("已在后台启动预计算，完成后刷新页面即可查看。")
+
+# 8. Backtest
 st.markdown("---")
 with st.expander("🛠️ 策略回测实验室 (点击展开)"):
     st.write("测试当前配置的策略表现：")
@@ -3,6 +3,8 @@ import pandas as pd
 import sqlite3
 from datetime import datetime
 import time
+import signal_calculator
+import data_versions
 
 DB_PATH = "stock_data.db"
 
@@ -112,7 +114,11 @@ def update_database():
     conn = sqlite3.connect(DB_PATH)
     df_merged.to_sql('stock_daily', conn, if_exists='replace', index=True)
     conn.close()
-    print("Database updated successfully.")
+
+    # Record point-in-time snapshot (delta vs previous version)
+    version = data_versions.record_snapshot(signal_calculator.load_data())
+    print(f"Database updated successfully. Data version: {version}")
+    return version
 
 if __name__ == "__main__":
     update_database()
@@ -0,0 +1,186 @@
+import argparse
+import datetime
+import json
+import math
+import sqlite3
+
+import pandas as pd
+
+import factors
+
+# Point-in-time Data Versions
+# Every ingest of stock_daily is recorded as a snapshot identified by its content hash
+# (factors.data_version, the same key used by the signal cache and results archive).
+# A snapshot stores only the rows that changed against its parent (upserts/deletes);
+# every CHECKPOINT_EVERY versions a full copy is stored so any version is rebuilt
+# from at most CHECKPOINT_EVERY deltas.
+
+DB_PATH = "stock_data.db"
+CHECKPOINT_EVERY = 20
+
+
+def init_db(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS snapshots (
+            version TEXT PRIMARY KEY,
+            parent TEXT,
+            depth INTEGER,           -- deltas since the last full checkpoint (0 = checkpoint)
+            created_at TEXT,
+            row_count INTEGER,
+            changed_rows INTEGER,
+            columns TEXT,            -- JSON: column order
+            dtypes TEXT              -- JSON: column -> dtype
+        )""")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS snapshot_rows (
+            version TEXT,
+            date TEXT,
+            op TEXT,                 -- 'full', 'upsert' or 'delete'
+            data TEXT                -- JSON list of values (column order of the snapshot)
+        )""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_snapshot_rows_version ON snapshot_rows (version)")
+    conn.execute("CREATE TABLE IF NOT EXISTS snapshot_head (id INTEGER PRIMARY KEY CHECK (id = 0), version TEXT)")
+    conn.commit()
+
+
+def _py(v):
+    if hasattr(v, 'item'):
+        v = v.item()
+    if isinstance(v, float) and math.isnan(v):
+        return None
+    return v
+
+
+def _row_map(df):
+    """date -> JSON encoded row (exact float round trip)."""
+    dates = df.index.strftime('%Y-%m-%d')
+    return {d: json.dumps([_py(v) for v in row]) for d, row in zip(dates, df.itertuples(index=False, name=None))}
+
+
+def head(conn=None):
+    """Version currently in stock_daily, or None if snapshots were never recorded."""
+    own = conn is None
+    conn = conn or sqlite3.connect(DB_PATH)
+    try:
+        init_db(conn)
+        row = conn.execute("SELECT version FROM snapshot_head WHERE id = 0").fetchone()
+        return row[0] if row else None
+    finally:
+        if own:
+            conn.close()
+
+
+def _set_head(conn, version):
+    conn.execute("INSERT OR REPLACE INTO snapshot_head (id, version) VALUES (0, ?)", (version,))
+
+
+def record_snapshot(df):
+    """
+    Records `df` (stock_daily as returned by load_data) as the new head version.
+    Stores a delta against the previous head, or a full checkpoint.
+
+    Returns:
+        str: The version (content hash).
+    """
+    version = factors.data_version(df)
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        init_db(conn)
+        parent = head(conn)
+        if parent == version:
+            return version
+
+        known = conn.execute("SELECT 1 FROM snapshots WHERE version = ?", (version,)).fetchone()
+        if known:
+            # Data reverted to an already stored version
+            with conn:
+                _set_head(conn, version)
+            return version
+
+        new_rows = _row_map(df)
+        parent_depth = None
+        if parent is not None:
+            r = conn.execute("SELECT depth FROM snapshots WHERE version = ?", (parent,)).fetchone()
+            parent_depth = r[0] if r else None
+
+        if parent_depth is None or parent_depth + 1 >= CHECKPOINT_EVERY:
+            depth = 0
+            rows = [(version, d, 'full', s) for d, s in new_rows.items()]
+            changed = len(rows)
+        else:
+            depth = parent_depth + 1
+            old_rows = _row_map(reconstruct(parent))
+            rows = [(version, d, 'upsert', s) for d, s in new_rows.items() if old_rows.get(d) != s]
+            rows += [(version, d, 'delete', None) for d in old_rows if d not in new_rows]
+            changed = len(rows)
+
+        with conn:
+            conn.execute(
+                "INSERT INTO snapshots VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (version, parent, depth, datetime.datetime.now().isoformat(timespec='seconds'),
+                 len(df), changed, json.dumps(list(df.columns)),
+                 json.dumps({c: str(t) for c, t in df.dtypes.items()})))
+            conn.executemany("INSERT INTO snapshot_rows VALUES (?, ?, ?, ?)", rows)
+            _set_head(conn, version)
+        print(f"Data version {version} recorded ({'checkpoint' if depth == 0 else f'{changed} changed rows'}).")
+        return version
+    finally:
+        conn.close()
+
+
+def reconstruct(version):
+    """Rebuilds stock_daily exactly as it was at `version`."""
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        init_db(conn)
+        # Walk back to the nearest checkpoint
+        chain = []
+        v = version
+        while v is not None:
+            meta = conn.execute("SELECT parent, depth, columns, dtypes FROM snapshots WHERE version = ?", (v,)).fetchone()
+            if meta is None:
+                raise KeyError(f"Unknown data version: {v}")
+            chain.append(v)
+            if meta[1] == 0:
+                break
+            v = meta[0]
+
+        columns, dtypes = None, None
+        rows = {}
+        for v in reversed(chain):
+            meta = conn.execute("SELECT columns, dtypes FROM snapshots WHERE version = ?", (v,)).fetchone()
+            columns, dtypes = json.loads(meta[0]), json.loads(meta[1])
+            for date, op, data in conn.execute("SELECT date, op, data FROM snapshot_rows WHERE version = ?", (v,)):
+                if op == 'delete':
+                    rows.pop(date, None)
+                else:
+                    rows[date] = json.loads(data)
+    finally:
+        conn.close()
+
+    dates = sorted(rows)
+    df = pd.DataFrame([rows[d] for d in dates], columns=columns, index=pd.to_datetime(dates))
+    df.index.name = 'date'
+    return df.astype(dtypes)
+
+
+def list_versions():
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        init_db(conn)
+        return pd.read_sql(
+            "SELECT version, parent, depth, created_at, row_count, changed_rows FROM snapshots ORDER BY created_at",
+            conn)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Point-in-time data versions")
+    parser.add_argument("version", nargs="?", help="Show the tail of this version")
+    args = parser.parse_args()
+    if args.version:
+        print(reconstruct(args.version).tail())
+    else:
+        print(list_versions().to_string())
+        print(f"Head: {head()}")
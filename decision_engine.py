@@ -1,5 +1,10 @@
+import numpy as np
 from config import StrategyConfig
 
+# Action codes for batch analysis (analyze_batch)
+HOLD, BUY_INITIAL, BUY_GRID, SELL = 0, 1, 2, 3
+ACTIONS = {HOLD: "HOLD", BUY_INITIAL: "BUY_INITIAL", BUY_GRID: "BUY_GRID", SELL: "SELL"}
+
 class DecisionEngine:
     def __init__(self, config: StrategyConfig):
         self.config = config
@@ -86,3 +91,52 @@ class DecisionEngine:
                  return "BUY_GRID", f"Grid Add: Price drop {grid_drop:.1%} (Current {price:.2f} < Last {last_buy_price:.2f})"
 
         return "HOLD", "No Signal"
+
+    def analyze_batch(self, data, position_count, last_buy_price):
+        """
+        Vectorized analyze() over many independent paths (same rules, same order).
+
+        Args:
+            data (dict): Same keys as analyze(), each a numpy array of shape (n,).
+            position_count (np.ndarray): Position units per path.
+            last_buy_price (np.ndarray): Last buy price per path (NaN = None).
+
+        Returns:
+            np.ndarray: Action codes (HOLD, BUY_INITIAL, BUY_GRID, SELL), shape (n,).
+        """
+        price = data['price']
+        pe_rank = data['pe_rank_5y']
+        vol_ratio = data['vol_ratio']
+        bias = data['bias_20']
+        ma60 = data['ma60']
+        bond_trend_down = data['bond_trend_down']
+        north_inflow = data['north_inflow_20']
+
+        buy_pe = self.config.get('buy_pe_threshold')
+        buy_vol = self.config.get('buy_vol_threshold')
+        sell_pe = self.config.get('sell_pe_threshold')
+        sell_bias = self.config.get('sell_bias_threshold')
+        grid_drop = self.config.get('grid_drop_pct')
+
+        # NaN comparisons are False, matching the scalar checks in analyze()
+        valid = ~(np.isnan(price) | np.isnan(pe_rank))
+        has_position = position_count > 0
+
+        # --- SELL LOGIC ---
+        sell = has_position & (((pe_rank > sell_pe) & (ma60 != 0) & (price < ma60)) | (bias > sell_bias))
+
+        # --- BUY LOGIC ---
+        buy_initial = ~has_position & (pe_rank < buy_pe) & (vol_ratio < buy_vol)
+        if self.config.get('enable_macro_filter'):
+            buy_initial &= bond_trend_down != 0
+        if self.config.get('enable_northbound_filter'):
+            buy_initial &= ~(north_inflow <= 0)
+
+        buy_grid = has_position & (last_buy_price != 0) & (price < last_buy_price * (1 - grid_drop))
+
+        action = np.full(price.shape, HOLD, dtype=np.int8)
+        action[buy_grid] = BUY_GRID
+        action[buy_initial] = BUY_INITIAL
+        action[sell] = SELL
+        action[~valid] = HOLD
+        return action
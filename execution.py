@@ -0,0 +1,209 @@
+import argparse
+import time
+
+import numpy as np
+
+# A-share Execution Model
+# Turns requested orders into executed ones with array operations, so the same code
+# serves a single order, a whole order trace, or one order per path (robustness):
+#   - lot rounding (100-share board lots)
+#   - participation cap (max fraction of the fill bar's volume)
+#   - slippage = base + impact * participation (volume dependent), charged as a
+#     cost on top of the reference (open) price, as Backtrader's commission scheme
+#     does, so fills and the grid's last buy price stay at the open in every engine
+#   - commission (with minimum) and stamp duty on sells
+# Plugged into fast_backtest / robustness via `execution=...` and into Backtrader
+# through strategy.ExecutionCommission / VolumeFiller. T+1 holds structurally in
+# the engines (next-open fills, one order at a time); apply_trace enforces it for
+# standalone order traces (e.g. replaying a live order log).
+
+
+class ExecutionModel:
+    def __init__(self, lot_size=100, commission=0.0003, min_commission=0.0, stamp_duty=0.0005,
+                 slippage_bps=1.0, impact=0.1, max_participation=0.1):
+        """
+        Args:
+            lot_size (int): Board lot; executed sizes are multiples of it.
+            commission (float): Commission rate on traded value.
+            min_commission (float): Minimum commission per order.
+            stamp_duty (float): Sell-side tax rate (0.05% for stocks; set 0 for ETFs).
+            slippage_bps (float): Fixed slippage in basis points.
+            impact (float): Extra slippage per unit of participation (size / bar volume).
+            max_participation (float): Max size as a fraction of the bar volume (None = no cap).
+        """
+        self.lot_size = lot_size
+        self.commission = commission
+        self.min_commission = min_commission
+        self.stamp_duty = stamp_duty
+        self.slippage_bps = slippage_bps
+        self.impact = impact
+        self.max_participation = max_participation
+
+    def round_lots(self, size):
+        size = np.asarray(size, dtype=float)
+        return np.floor(np.maximum(size, 0) / self.lot_size) * self.lot_size
+
+    def cap(self, size, volume):
+        """Lot-rounded size limited by the participation cap."""
+        size = self.round_lots(size)
+        if self.max_participation is None:
+            return size
+        volume = np.nan_to_num(np.asarray(volume, dtype=float), nan=0.0)
+        return np.minimum(size, self.round_lots(volume * self.max_participation))
+
+    def slippage(self, size, volume):
+        """Slippage as a fraction of price."""
+        volume = np.asarray(volume, dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            participation = np.where(volume > 0, np.asarray(size, dtype=float) / volume, 0.0)
+        return self.slippage_bps / 1e4 + self.impact * participation
+
+    def costs(self, side, size, price, volume=None):
+        """
+        Commission (+ stamp duty on sells) for executed size at the reference price,
+        plus the slippage cost when the bar `volume` is given.
+        """
+        side = np.asarray(side)
+        value = np.asarray(size, dtype=float) * np.asarray(price, dtype=float)
+        comm = np.maximum(value * self.commission, np.where(value > 0, self.min_commission, 0.0))
+        total = comm + np.where(side < 0, value * self.stamp_duty, 0.0)
+        if volume is not None:
+            total = total + value * self.slippage(size, volume)
+        return total
+
+    def execute(self, side, size, price, volume):
+        """
+        Executes orders (element-wise over arrays).
+
+        Args:
+            side: +1 buy / -1 sell.
+            size: Requested shares (positive).
+            price: Reference fill price (e.g. next bar open).
+            volume: Volume of the fill bar.
+
+        Returns:
+            tuple: (executed size, fill price, costs incl. slippage)
+        """
+        side = np.asarray(side)
+        size = self.cap(size, volume)
+        fill_price = np.asarray(price, dtype=float) * np.ones_like(size)
+        return size, fill_price, self.costs(side, size, fill_price, volume)
+
+    def apply_trace(self, bar, side, size, price, volume, position=0):
+        """
+        Executes a whole order trace at once, enforcing T+1: a bar's sells are
+        capped (cumulatively) at the shares held at the start of that bar, so
+        shares bought on the bar cannot be sold on it.
+
+        Args:
+            bar (np.ndarray): Bar index of each order's fill (non-decreasing).
+            position (float): Shares held before the first bar.
+        Returns:
+            tuple: (executed size, fill price, costs)
+        """
+        bar = np.asarray(bar, dtype=int)
+        side = np.asarray(side)
+        exec_size, fill_price, _ = self.execute(side, size, price, volume)
+        if not len(bar):
+            return exec_size, fill_price, self.costs(side, exec_size, fill_price, volume)
+
+        # Shares held at the start of each bar follow a reflected walk (Lindley
+        # recursion): after a bar's sells Q_b = max(Q_{b-1} + bought_{b-1} - sold_b, 0),
+        # in closed form Q = A - min(0, running min A) with A the unclipped walk.
+        n_bars = bar.max() + 1
+        sell = side < 0
+        bought = np.bincount(bar, weights=np.where(side > 0, exec_size, 0.0), minlength=n_bars)
+        sold = np.bincount(bar, weights=np.where(sell, exec_size, 0.0), minlength=n_bars)
+        prev_bought = np.concatenate(([0.0], bought[:-1]))
+        walk = float(position) + np.cumsum(prev_bought - sold)
+        after_sells = walk - np.minimum(0.0, np.minimum.accumulate(walk))
+        held = np.concatenate(([float(position)], after_sells[:-1] + bought[:-1]))
+
+        # Within a bar, sells consume the start-of-bar holding in order
+        requested = np.where(sell, exec_size, 0.0)
+        before = np.cumsum(requested) - requested
+        first = np.searchsorted(bar, bar) # Index of each bar's first order
+        before = before - before[first]
+        available = self.round_lots(np.maximum(held[bar] - before, 0))
+        exec_size = np.where(sell, np.minimum(exec_size, available), exec_size)
+        return exec_size, fill_price, self.costs(side, exec_size, fill_price, volume)
+
+
+def benchmark(n_runs=20):
+    """Times the fast engine with and without the execution model on the local data."""
+    import pandas as pd
+    import signal_calculator
+    from fast_backtest import run_fast_backtest
+    from run_backtest import START_DATE
+
+    df = signal_calculator.calculate_signals(signal_calculator.load_data())
+    df = df[df.index >= pd.to_datetime(START_DATE)]
+    model = ExecutionModel()
+
+    timings = {}
+    for label, execution in [("flat commission", None), ("execution model", model)]:
+        run_fast_backtest(df, execution=execution) # warm up
+        t0 = time.perf_counter()
+        for _ in range(n_runs):
+            res = run_fast_backtest(df, execution=execution)
+        timings[label] = (time.perf_counter() - t0) / n_runs
+        print(f"{label:16s}: {timings[label] * 1000:8.2f} ms/run  Return {res['return']:.2%}  Trades {res['trades']}")
+    overhead = timings["execution model"] / timings["flat commission"] - 1
+    print(f"Overhead: {overhead:.1%}")
+
+    # Raw throughput of the vectorized trace path
+    n = 1_000_000
+    rng = np.random.default_rng(0)
+    t0 = time.perf_counter()
+    model.apply_trace(np.sort(rng.integers(0, 250_000, n)), rng.choice([-1, 1], n),
+                      rng.uniform(100, 10000, n), rng.uniform(1000, 3000, n), rng.uniform(1e7, 1e9, n))
+    print(f"apply_trace: {n:,} orders in {(time.perf_counter() - t0) * 1000:.1f} ms")
+    return timings
+
+
+def parity(n_configs=30, model=None, seed=0, tol=1e-6):
+    """
+    Runs random configs through the fast engine, the robustness engine (actual
+    history as one path) and Backtrader with the same ExecutionModel, and reports
+    configs whose total returns differ. Returns the list of mismatches.
+    """
+    import pandas as pd
+    import signal_calculator
+    import run_backtest
+    from fast_backtest import run_fast_backtest
+    from robustness import simulate_paths, history_paths
+    from config import StrategyConfig
+
+    model = model or ExecutionModel()
+    rng = np.random.default_rng(seed)
+    raw = signal_calculator.load_data()
+    df = signal_calculator.calculate_signals(raw, windows=StrategyConfig().get('signal_windows'))
+    df = df[df.index >= pd.to_datetime(run_backtest.START_DATE)]
+
+    mismatches = []
+    for _ in range(n_configs):
+        params = {
+            'buy_pe_threshold': float(rng.uniform(0.2, 0.6)),
+            'buy_vol_threshold': float(rng.uniform(0.6, 1.6)),
+            'grid_drop_pct': float(rng.uniform(0.02, 0.08)),
+            'sell_pe_threshold': float(rng.uniform(0.6, 0.8)),
+            'position_step_pct': float(rng.uniform(0.2, 0.45)),
+        }
+        fast = run_fast_backtest(df, params, execution=model)['return']
+        paths = float(simulate_paths(history_paths(df), params, execution=model)['return'][0])
+        backtrader = run_backtest.run_backtest(data=raw, execution=model, **params)['return']
+        if abs(fast - backtrader) > tol or abs(paths - backtrader) > tol:
+            mismatches.append((params, fast, paths, backtrader))
+            print(f"Mismatch: fast {fast:.6f} paths {paths:.6f} backtrader {backtrader:.6f} | {params}")
+    print(f"Parity: {n_configs - len(mismatches)}/{n_configs} configs agree across the three engines")
+    return mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="A-share execution model")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--parity", type=int, metavar="N", help="Check N random configs across the three engines instead")
+    args = parser.parse_args()
+    if args.parity:
+        raise SystemExit(1 if parity(args.parity) else 0)
+    benchmark(args.runs)
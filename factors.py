@@ -0,0 +1,217 @@
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Factor Registry
+# Every signal column declares its inputs (raw series or other factors) and its window.
+# evaluate() resolves only the sub-DAG needed for the requested columns, shares
+# intermediates (e.g. one cumulative sum per series feeds every moving average on it)
+# and caches results in a bounded LRU keyed by (series, kind, window, data version),
+# so parameter sweeps over window lengths compute each distinct column only once.
+
+REGISTRY = {}
+
+# Columns produced by calculate_signals() when no subset is requested (the live path).
+LIVE_COLUMNS = []
+
+MAX_CACHE_ENTRIES = 256 # Cached columns/intermediates across all versions and windows
+
+_cache = OrderedDict() # (series, kind, window, data_version) -> value
+_stats = {'hits': 0, 'misses': 0}
+
+
+class Factor:
+    def __init__(self, name, kind, inputs, window=None, min_periods=None, func=None, live=True):
+        self.name = name
+        self.kind = kind          # 'mean', 'sum', 'rank', 'expr' or 'cumsum' (intermediate)
+        self.inputs = list(inputs)
+        self.window = window
+        self.min_periods = min_periods
+        self.func = func
+        self.live = live
+        self.series = None        # Raw series for 'mean'/'sum' (set by register)
+
+    def compute(self, values, index, window):
+        if self.kind in ('mean', 'sum'):
+            csum, ccount = values[0]
+            return pd.Series(_rolling_from_cumsum(csum, ccount, window, self.kind), index=index)
+        if self.kind == 'rank':
+            min_periods = min(self.min_periods, window) if self.min_periods else None
+            return values[0].rolling(window=window, min_periods=min_periods).rank(pct=True)
+        if self.kind == 'cumsum':
+            arr = values[0].to_numpy(dtype=float)
+            valid = ~np.isnan(arr)
+            return np.cumsum(np.where(valid, arr, 0.0)), np.cumsum(valid)
+        if self.kind == 'expr':
+            return self.func(*values)
+        raise ValueError(f"Unknown factor kind: {self.kind}")
+
+
+def _cumsum_name(series):
+    return f"_cumsum_{series}"
+
+
+def register(name, kind, inputs, window=None, min_periods=None, func=None, live=True):
+    """
+    Registers a factor. Rolling 'mean'/'sum' factors read from a shared
+    cumulative-sum intermediate of their input series.
+    """
+    series = None
+    if kind in ('mean', 'sum'):
+        series = inputs[0]
+        csum_name = _cumsum_name(series)
+        if csum_name not in REGISTRY:
+            REGISTRY[csum_name] = Factor(csum_name, 'cumsum', [series], live=False)
+        inputs = [csum_name]
+
+    factor = Factor(name, kind, inputs, window, min_periods, func, live)
+    factor.series = series
+    REGISTRY[name] = factor
+    if live and name not in LIVE_COLUMNS:
+        LIVE_COLUMNS.append(name)
+    return factor
+
+
+def _rolling_from_cumsum(csum, ccount, window, how):
+    # Same NaN semantics as pandas rolling(window) with min_periods=window:
+    # any missing value inside the window yields NaN.
+    n = len(csum)
+    out = np.full(n, np.nan)
+    if window > n:
+        return out
+    s = np.concatenate(([0.0], csum))
+    c = np.concatenate(([0], ccount))
+    total = s[window:] - s[:-window]
+    count = c[window:] - c[:-window]
+    vals = total if how == 'sum' else total / window
+    out[window - 1:] = np.where(count == window, vals, np.nan)
+    return out
+
+
+def data_version(df):
+    """Content hash of a frame (index + values)."""
+    h = pd.util.hash_pandas_object(df, index=True).to_numpy()
+    cols = ",".join(map(str, df.columns)).encode()
+    return hashlib.sha1(h.tobytes() + cols).hexdigest()[:16]
+
+
+def default_windows():
+    """Window of every windowed factor, keyed by factor name."""
+    return {name: f.window for name, f in REGISTRY.items() if f.window is not None}
+
+
+def lookback(columns=None, windows=None):
+    """
+    Number of trailing rows needed to compute the latest value of `columns`
+    (largest window in their sub-DAG). Used to extend signals incrementally.
+    """
+    columns = LIVE_COLUMNS if columns is None else columns
+    windows = windows or {}
+
+    def walk(name):
+        factor = REGISTRY.get(name)
+        if factor is None:
+            return 1
+        own = windows.get(name, factor.window) or 1
+        return max([own] + [walk(i) for i in factor.inputs])
+
+    return max(walk(c) for c in columns)
+
+
+def _cache_get(key):
+    if key in _cache:
+        _cache.move_to_end(key)
+        _stats['hits'] += 1
+        return _cache[key]
+    return None
+
+
+def _cache_put(key, value):
+    _stats['misses'] += 1
+    _cache[key] = value
+    while len(_cache) > MAX_CACHE_ENTRIES:
+        _cache.popitem(last=False)
+
+
+def evaluate(df, columns=None, windows=None, version=None):
+    """
+    Returns a copy of df with the requested factor columns added.
+    Only the factors needed for `columns` (default: LIVE_COLUMNS) are computed.
+
+    `windows` overrides factor windows by name (e.g. {'ma20': 30, 'pe_rank_5y': 2500});
+    column names stay the same so downstream consumers are unaffected.
+    """
+    columns = LIVE_COLUMNS if columns is None else columns
+    windows = windows or {}
+    version = version or data_version(df)
+
+    def resolve(name):
+        factor = REGISTRY.get(name)
+        if factor is None:
+            # Raw input column
+            return df[name], (name, 'raw', None, version)
+
+        resolved = [resolve(i) for i in factor.inputs]
+        window = windows.get(name, factor.window)
+        if factor.kind in ('mean', 'sum'):
+            key = (factor.series, factor.kind, window, version)
+        elif factor.kind == 'rank':
+            # min_periods changes the warmup values, so ranks differing only in it are distinct
+            key = (factor.inputs[0], factor.kind, window, factor.min_periods, version)
+        elif factor.kind == 'cumsum':
+            key = (factor.inputs[0], factor.kind, window, version)
+        else:
+            # Derived columns are keyed by the exact inputs they were built from
+            key = (name, factor.kind, tuple(k for _, k in resolved), version)
+
+        value = _cache_get(key)
+        if value is None:
+            value = factor.compute([v for v, _ in resolved], df.index, window)
+            _cache_put(key, value)
+        return value, key
+
+    out = df.copy()
+    for name in columns:
+        if name not in REGISTRY:
+            raise KeyError(f"Unknown factor: {name}")
+        out[name] = resolve(name)[0]
+    return out
+
+
+def cache_info():
+    return {**_stats, 'size': len(_cache), 'max_size': MAX_CACHE_ENTRIES}
+
+
+def clear_cache():
+    _cache.clear()
+    _stats['hits'] = 0
+    _stats['misses'] = 0
+
+
+# --- Live Factors ---
+# Order matches the columns historically produced by calculate_signals.
+
+# 1. PE Percentiles (Rolling)
+# 5 Years approx 1250 trading days, 10 Years approx 2500 trading days.
+# min_periods allows calculation even if we don't have full history at the start.
+register('pe_rank_5y', 'rank', ['pe_ttm'], window=1250, min_periods=250)
+register('pe_rank_10y', 'rank', ['pe_ttm'], window=2500, min_periods=250)
+
+# 2. Sentiment: Bias 20
+register('ma20', 'mean', ['close'], window=20)
+register('ma60', 'mean', ['close'], window=60)
+register('bias_20', 'expr', ['close', 'ma20'], func=lambda close, ma20: (close - ma20) / ma20)
+
+# 3. Sentiment: Volume Ratio (MA5 / MA60)
+register('vol_ma5', 'mean', ['volume'], window=5)
+register('vol_ma60', 'mean', ['volume'], window=60)
+register('vol_ratio', 'expr', ['vol_ma5', 'vol_ma60'], func=lambda a, b: a / b)
+
+# 4. Macro: Northbound Net Inflow (20 days sum)
+register('north_inflow_20', 'sum', ['north_net_inflow'], window=20)
+
+# 5. Macro: Bond Yield Trend (Current < MA60)
+register('bond_ma60', 'mean', ['cn10y'], window=60)
+register('bond_trend_down', 'expr', ['cn10y', 'bond_ma60'], func=lambda y, ma: y < ma)
@@ -0,0 +1,259 @@
+import numpy as np
+import pandas as pd
+from config import StrategyConfig
+from decision_engine import DecisionEngine
+from constraints import pruned_info
+
+# Lightweight backtest engine
+# Replays ChiNextStrategy on plain arrays without Backtrader's event machinery:
+# same DecisionEngine, market orders filled at the next bar's open, same sizing
+# rules and commission. Metrics follow Backtrader's SharpeRatio (yearly returns,
+# 1% risk free) and DrawDown analyzers so results are comparable with run_backtest.
+
+START_CASH = 1000000.0
+COMMISSION = 0.0003
+RISK_FREE_RATE = 0.01
+
+SIGNAL_COLUMNS = ['close', 'open', 'volume', 'pe_rank_5y', 'vol_ratio', 'bias_20', 'ma60', 'bond_trend_down', 'north_inflow_20']
+
+
+def make_config(params=None):
+    """StrategyConfig with in-memory overrides (never written to disk)."""
+    config = StrategyConfig()
+    config.params.update(params or {})
+    return config
+
+
+def to_arrays(df):
+    """Extracts the columns the engine needs from a signal frame."""
+    arrays = {c: df[c].to_numpy(dtype=float) for c in SIGNAL_COLUMNS}
+    arrays['date'] = df.index.to_numpy()
+    arrays['year'] = df.index.year.to_numpy()
+    return arrays
+
+
+def run_fast_backtest(df, params=None, cash=START_CASH, commission=COMMISSION, constraints=None, execution=None):
+    """
+    Runs the strategy over a signal frame (output of calculate_signals).
+
+    Args:
+        constraints (RunConstraints, optional): Stop early on the first violation.
+        execution (ExecutionModel, optional): Lots, volume caps, slippage and costs.
+            Defaults to the flat `commission` (previous behaviour).
+
+    Returns:
+        dict: sharpe, return, drawdown (%), trades, equity (pd.Series), trade_list,
+              pruned (None, or reason/date/bar of the violation)
+    """
+    config = make_config(params)
+    arrays = to_arrays(df)
+
+    state = new_state(cash)
+    step(state, arrays, DecisionEngine(config), config, commission, constraints=constraints, execution=execution)
+    return summarize(state, cash)
+
+
+def new_state(cash=START_CASH):
+    return {
+        'cash': cash,
+        'size': 0,
+        'last_buy_price': None,
+        'grid_count': 0,
+        'pending': None,      # ('BUY', size) or ('SELL', size), filled at next open
+        'entry_date': None,
+        'entry_cost': 0.0,
+        'dates': [],
+        'values': [],
+        'trade_list': [],
+        'fills': 0,           # Executed orders (buys + sells)
+        'pruned': None,       # Set when a RunConstraints check fails
+        # Analyzer accumulators (updated per bar, so metrics never rescan the curve)
+        'peak': cash,
+        'max_dd': 0.0,
+        'year_end': {},       # year -> last value of that year
+    }
+
+
+def step(state, arrays, engine, config, commission=COMMISSION, start=0, end=None, constraints=None, execution=None):
+    """
+    Advances the state over bars [start, end). Returns the index of the next bar.
+    With `constraints`, stops after the first violating bar and records state['pruned'].
+    """
+    close = arrays['close']
+    open_ = arrays['open']
+    volume = arrays['volume']
+    pe_rank = arrays['pe_rank_5y']
+    vol_ratio = arrays['vol_ratio']
+    bias = arrays['bias_20']
+    ma60 = arrays['ma60']
+    bond = arrays['bond_trend_down']
+    north = arrays['north_inflow_20']
+    dates = arrays['date']
+    years = arrays['year']
+
+    step_pct = config.get('position_step_pct')
+    max_pct = config.get('max_position_pct')
+
+    end = len(close) if end is None else end
+    for i in range(start, end):
+        # 1. Fill pending order at this bar's open. A volume-capped remainder stays
+        # pending (like a partially filled Backtrader market order) and blocks new orders.
+        if state['pending'] is not None:
+            side = state['pending'][0]
+            remaining = _fill(state, state['pending'], open_[i], dates[i], commission, volume[i], execution)
+            state['pending'] = (side, remaining) if remaining > 0 else None
+
+        # 2. Mark to market
+        value = state['cash'] + state['size'] * close[i]
+        state['dates'].append(dates[i])
+        state['values'].append(value)
+        state['peak'] = max(state['peak'], value)
+        state['max_dd'] = max(state['max_dd'], (state['peak'] - value) / state['peak'] * 100)
+        state['year_end'][int(years[i])] = value
+
+        if constraints is not None:
+            reason = constraints.check(dates[i], value, state['peak'], state['fills'])
+            if reason:
+                state['pruned'] = pruned_info(reason, dates[i], i)
+                return i + 1
+
+        # 3. Decide
+        if state['pending'] is not None:
+            continue
+        data_dict = {
+            'price': close[i],
+            'pe_rank_5y': pe_rank[i],
+            'vol_ratio': vol_ratio[i],
+            'bias_20': bias[i],
+            'ma60': ma60[i],
+            'bond_trend_down': bond[i],
+            'north_inflow_20': north[i]
+        }
+        pos_count = 1 if state['size'] > 0 else 0
+        decision, _ = engine.analyze(data_dict, pos_count, state['last_buy_price'])
+
+        if decision == "SELL":
+            if state['size'] > 0:
+                state['pending'] = ('SELL', state['size'])
+
+        elif decision == "BUY_INITIAL":
+            if pe_rank[i] > 0:
+                # order_target_percent: size the gap to target at the current close
+                gap = value * step_pct - state['size'] * close[i]
+                size = int(gap / close[i])
+                if execution is not None:
+                    size = int(execution.round_lots(size))
+                if size > 0:
+                    state['pending'] = ('BUY', size)
+
+        elif decision == "BUY_GRID":
+            pos_pct = state['size'] * close[i] / value
+            if pos_pct < max_pct - 0.01:
+                size = int((value * step_pct) / close[i])
+                if execution is not None:
+                    size = int(execution.round_lots(size))
+                if size > 0:
+                    state['pending'] = ('BUY', size)
+
+        if execution is not None and state['pending'] is not None and state['pending'][0] == 'BUY':
+            # Backtrader checks cash on submission, at the signal bar's close
+            size = state['pending'][1]
+            fill_volume = volume[i + 1] if i + 1 < len(volume) else volume[i]
+            if size * close[i] + float(execution.costs(1, size, close[i], fill_volume)) > state['cash']:
+                state['pending'] = None # Margin: rejected
+
+    return end
+
+
+def _fill(state, order, price, date, commission, volume=None, execution=None):
+    """Fills (part of) an order. Returns the size still to fill (0 = done or rejected)."""
+    # T+1 holds structurally: fills happen at the next bar's open and only one
+    # order is pending at a time, so a sell never fills on its buy's bar.
+    side, requested = order
+    qty, value = state.pop('order_fill', (0, 0.0)) # Earlier partial fills of this order
+    if execution is not None:
+        # Fill at the open; slippage is part of `comm` (as in strategy.ExecutionCommission)
+        size, price, comm = execution.execute(1 if side == 'BUY' else -1, requested, price, volume)
+        size, price, comm = int(size), float(price), float(comm)
+    else:
+        size = requested
+        comm = size * price * commission
+    remaining = requested - size
+
+    if side == 'BUY':
+        if size * price + comm > state['cash']:
+            return 0 # Margin: rejected
+        if size <= 0:
+            state['order_fill'] = (qty, value)
+            return remaining # No volume for a lot: retry next bar
+        cost = size * price
+        if state['size'] == 0:
+            state['entry_date'] = date
+            state['entry_cost'] = 0.0
+        state['cash'] -= cost + comm
+        state['size'] += size
+        state['entry_cost'] += cost + comm
+        if remaining > 0:
+            state['order_fill'] = (qty + size, value + cost)
+            return remaining
+        state['fills'] += 1
+        # Average price over the order's partial fills (Backtrader's executed.price)
+        state['last_buy_price'] = (value + cost) / (qty + size)
+        state['grid_count'] += 1
+    else:
+        if size <= 0:
+            state['order_fill'] = (qty, value)
+            return remaining
+        proceeds = size * price
+        state['cash'] += proceeds - comm
+        state['size'] -= size
+        if state['size'] > 0:
+            # Partial sell (volume cap): realize pro rata, trade stays open
+            sold_cost = state['entry_cost'] * size / (state['size'] + size)
+            state['entry_cost'] -= sold_cost
+            state['partial_pnl'] = state.get('partial_pnl', 0.0) + proceeds - comm - sold_cost
+            state['order_fill'] = (qty + size, value + proceeds)
+            return remaining
+        state['fills'] += 1
+        state['trade_list'].append({
+            'entry_date': state['entry_date'],
+            'exit_date': date,
+            'pnl': proceeds - comm - state['entry_cost'] + state.pop('partial_pnl', 0.0),
+        })
+        state['last_buy_price'] = None
+        state['grid_count'] = 0
+        state['entry_cost'] = 0.0
+    return 0
+
+
+def yearly_sharpe(year_end, cash=START_CASH, riskfree=RISK_FREE_RATE):
+    """
+    Backtrader SharpeRatio default: yearly returns, population std, no annualization.
+
+    Args:
+        year_end (dict): year -> portfolio value at the last bar of that year.
+    """
+    if not year_end:
+        return None
+    ends = np.array([year_end[y] for y in sorted(year_end)], dtype=float)
+    prev = np.concatenate(([cash], ends[:-1]))
+    excess = ends / prev - 1 - riskfree
+    std = excess.std()
+    if len(excess) < 2 or std == 0:
+        return None
+    return excess.mean() / std
+
+
+def summarize(state, cash=START_CASH):
+    sharpe = yearly_sharpe(state['year_end'], cash)
+    if sharpe is None: sharpe = -999 # Same convention as run_backtest
+    final_value = state['values'][-1] if state['values'] else cash
+    return {
+        'sharpe': sharpe,
+        'return': (final_value - cash) / cash,
+        'drawdown': state['max_dd'],
+        'trades': len(state['trade_list']),
+        'equity': pd.Series(state['values'], index=pd.DatetimeIndex(state['dates']), name='value'),
+        'trade_list': state['trade_list'],
+        'pruned': state.get('pruned'),
+    }
@@ -0,0 +1,271 @@
+import argparse
+import sqlite3
+import time
+from collections import deque
+from datetime import datetime
+
+import akshare as ak
+import pandas as pd
+
+import notifier
+import signal_calculator
+from config import StrategyConfig
+from decision_engine import DecisionEngine
+from main import load_state
+
+# Intraday Mode
+# Ingests 399006 minute bars into an append-only table and keeps the rolling daily
+# signals up to date bar by bar, treating today's partial session as a provisional
+# daily bar (close = last minute close, volume = cumulative volume projected to the
+# full session). Every update is O(1); DecisionEngine.analyze runs every EVAL_EVERY
+# bars so a provisional BUY/SELL shows up before the close without recomputing the
+# full history. At each day rollover the state is re-seeded from stock_daily.
+
+DB_PATH = "stock_data.db"
+SYMBOL = "399006"
+EVAL_EVERY = 5          # Evaluate the decision every N minute bars
+POLL_SECONDS = 60
+# Minute volumes are reported in lots (手); daily index volume is in shares.
+MINUTE_VOLUME_SCALE = 100
+# Continuous session: 09:30-11:30 and 13:00-15:00
+SESSION_MINUTES = 240
+# The 09:30 bar carries the opening call auction, and the first minutes trade well
+# above the average rate: projecting them linearly would multiply the auction volume
+# by up to 240. The elapsed fraction is floored at this many minutes instead.
+MIN_PROJECTION_MINUTES = 30
+
+
+def session_fraction(ts):
+    """
+    Elapsed fraction of the trading session at bar time `ts` (bars are stamped at
+    their end), floored at MIN_PROJECTION_MINUTES for the opening bars.
+
+    >>> session_fraction(pd.Timestamp('2024-01-02 09:30'))  # auction bar
+    0.125
+    >>> session_fraction(pd.Timestamp('2024-01-02 09:31'))
+    0.125
+    >>> session_fraction(pd.Timestamp('2024-01-02 10:30'))
+    0.25
+    >>> session_fraction(pd.Timestamp('2024-01-02 12:00'))  # lunch break
+    0.5
+    >>> session_fraction(pd.Timestamp('2024-01-02 15:00'))
+    1.0
+    """
+    minute = ts.hour * 60 + ts.minute
+    morning = min(max(minute - (9 * 60 + 30), 0), 120)
+    afternoon = min(max(minute - 13 * 60, 0), 120)
+    return max(morning + afternoon, MIN_PROJECTION_MINUTES) / SESSION_MINUTES
+
+
+# --- Storage ---
+
+def init_db(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS stock_minute (
+            ts INTEGER PRIMARY KEY,   -- unix seconds (exchange local time)
+            open REAL, high REAL, low REAL, close REAL, volume REAL
+        ) WITHOUT ROWID""")
+
+
+def fetch_minute_bars(start=None):
+    """Minute bars from AkShare (today's session by default)."""
+    start = start or datetime.now().strftime("%Y-%m-%d 09:30:00")
+    try:
+        df = ak.index_zh_a_hist_min_em(symbol=SYMBOL, period="1", start_date=start,
+                                       end_date=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        df['ts'] = pd.to_datetime(df['时间'])
+        df = df.rename(columns={'开盘': 'open', '最高': 'high', '最低': 'low', '收盘': 'close', '成交量': 'volume'})
+        df['volume'] = df['volume'] * MINUTE_VOLUME_SCALE
+        return df[['ts', 'open', 'high', 'low', 'close', 'volume']]
+    except Exception as e:
+        print(f"Error fetching minute data: {e}")
+        return pd.DataFrame()
+
+
+def append_minute_bars(df):
+    """Appends new bars (existing timestamps are ignored). Returns rows added."""
+    if df.empty:
+        return 0
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        init_db(conn)
+        rows = [(int(r.ts.timestamp()), r.open, r.high, r.low, r.close, r.volume) for r in df.itertuples(index=False)]
+        before = conn.total_changes
+        with conn:
+            conn.executemany("INSERT OR IGNORE INTO stock_minute VALUES (?, ?, ?, ?, ?, ?)", rows)
+        return conn.total_changes - before
+    finally:
+        conn.close()
+
+
+def load_minute_bars(since_ts=0):
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        init_db(conn)
+        df = pd.read_sql("SELECT * FROM stock_minute WHERE ts > ? ORDER BY ts", conn, params=(since_ts,))
+    finally:
+        conn.close()
+    df['time'] = pd.to_datetime(df['ts'], unit='s')
+    return df
+
+
+# --- Rolling State ---
+
+class RollingWindow:
+    """Sum of the last `window - 1` completed values; the provisional value completes the window."""
+
+    def __init__(self, window, history):
+        self.window = window
+        self.values = deque(history[-(window - 1):] if window > 1 else [], maxlen=max(window - 1, 0))
+        self.total = float(sum(self.values))
+
+    def push(self, x):
+        if self.window > 1:
+            if len(self.values) == self.values.maxlen:
+                self.total -= self.values[0]
+            self.values.append(x)
+            self.total += x
+
+    def mean(self, provisional):
+        if len(self.values) < self.window - 1:
+            return float('nan')
+        return (self.total + provisional) / self.window
+
+
+class IntradaySignals:
+    def __init__(self, daily, windows=None):
+        """
+        Args:
+            daily (pd.DataFrame): Signal frame of completed days (calculate_signals output).
+        """
+        windows = windows or {}
+        closes = daily['close'].tolist()
+        volumes = daily['volume'].tolist()
+        self.ma20 = RollingWindow(windows.get('ma20', 20), closes)
+        self.ma60 = RollingWindow(windows.get('ma60', 60), closes)
+        self.vol_ma5 = RollingWindow(windows.get('vol_ma5', 5), volumes)
+        self.vol_ma60 = RollingWindow(windows.get('vol_ma60', 60), volumes)
+
+        # Daily-only inputs: carried from the last completed day
+        last = daily.iloc[-1]
+        self.static = {k: last[k] for k in ('pe_rank_5y', 'bond_trend_down', 'north_inflow_20')}
+
+        self.last_day = daily.index[-1].date()
+        self.day = None
+        self.ts = None
+        self.close = None
+        self.day_volume = 0.0
+        self.bars = 0
+
+    def update(self, ts, close, volume):
+        """Adds one minute bar. O(1)."""
+        day = ts.date()
+        if day <= self.last_day:
+            return # Already part of the daily history
+        if self.day is not None and day != self.day:
+            self._roll()
+        self.day = day
+        self.ts = ts
+        self.close = close
+        self.day_volume += volume
+        self.bars += 1
+
+    def _roll(self):
+        # Close out the provisional day as a completed daily bar. Only used when the
+        # daily table has not caught up yet; IntradayMonitor re-seeds otherwise.
+        self.ma20.push(self.close)
+        self.ma60.push(self.close)
+        self.vol_ma5.push(self.day_volume)
+        self.vol_ma60.push(self.day_volume)
+        self.last_day = self.day
+        self.day_volume = 0.0
+
+    def signals(self):
+        """Provisional daily signals in the DecisionEngine input format."""
+        ma20 = self.ma20.mean(self.close)
+        # A partial session's volume projected to a full day, so an early
+        # vol_ratio is not biased low (toward BUY_INITIAL)
+        day_volume = self.day_volume / session_fraction(self.ts)
+        vol_ma5 = self.vol_ma5.mean(day_volume)
+        vol_ma60 = self.vol_ma60.mean(day_volume)
+        return {
+            'price': self.close,
+            'pe_rank_5y': self.static['pe_rank_5y'],
+            'vol_ratio': vol_ma5 / vol_ma60 if vol_ma60 else float('nan'),
+            'bias_20': (self.close - ma20) / ma20,
+            'ma60': self.ma60.mean(self.close),
+            'bond_trend_down': self.static['bond_trend_down'],
+            'north_inflow_20': self.static['north_inflow_20'],
+        }
+
+
+class IntradayMonitor:
+    def __init__(self):
+        self.state = self.seed()
+        self.last_ts = 0
+        self.last_action = None
+
+    def seed(self):
+        """Rolling state from the daily table (official bars, daily-only factors)."""
+        config = StrategyConfig()
+        self.engine = DecisionEngine(config)
+        daily = signal_calculator.calculate_signals(
+            signal_calculator.load_data(), columns=['pe_rank_5y', 'north_inflow_20', 'bond_trend_down'],
+            windows=config.get('signal_windows'))
+        return IntradaySignals(daily, config.get('signal_windows'))
+
+    def roll_day(self):
+        """At a day rollover, re-seeds from stock_daily once it holds the finished day."""
+        state = self.seed()
+        if state.last_day >= self.state.day:
+            self.state = state
+        else:
+            print(f"Daily data not updated for {self.state.day} yet; rolling minute bars forward.")
+
+    def process_new_bars(self):
+        """Feeds stored bars not yet seen; evaluates on the cadence. Returns the last decision."""
+        bars = load_minute_bars(self.last_ts)
+        decision = None
+        for row in bars.itertuples(index=False):
+            if self.state.day is not None and row.time.date() != self.state.day:
+                self.roll_day()
+            self.state.update(row.time, row.close, row.volume)
+            self.last_ts = row.ts
+            if self.state.close is not None and self.state.bars % EVAL_EVERY == 0:
+                decision = self.evaluate(row.time)
+        return decision
+
+    def evaluate(self, ts):
+        state = load_state()
+        data = self.state.signals()
+        action, reason = self.engine.analyze(data, len(state.get("positions", [])), state.get("last_buy_price"))
+        if action != "HOLD" and action != self.last_action:
+            notifier.notify(f"ChiNext Provisional Signal: {action}",
+                            f"Time: {ts}\nPrice: {data['price']:.2f}\nBias: {data['bias_20']:.2%}\n"
+                            f"Vol Ratio: {data['vol_ratio']:.2f}\nReason: {reason}\n(Provisional, before close)")
+        self.last_action = action
+        return ts, action, reason
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Intraday provisional signals")
+    parser.add_argument("--once", action="store_true", help="Ingest available bars, print the provisional decision and exit")
+    args = parser.parse_args()
+
+    monitor = IntradayMonitor()
+    while True:
+        added = append_minute_bars(fetch_minute_bars())
+        decision = monitor.process_new_bars()
+        if decision:
+            ts, action, reason = decision
+            print(f"[{ts}] +{added} bars, provisional {action}: {reason}")
+        if args.once:
+            if monitor.state.close is not None:
+                ts, action, reason = monitor.evaluate(datetime.now())
+                print(f"[{ts}] Provisional {action}: {reason}")
+            break
+        time.sleep(POLL_SECONDS)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,10 +6,9 @@ import argparse
 import pandas as pd
 from datetime import datetime
 import data_loader
-import signal_calculator
 import notifier
-from config import StrategyConfig
-from decision_engine import DecisionEngine
+import performance_tracker
+from signal_service import get_client
 
 STATE_FILE = "trade_state.json"
 
@@ -29,9 +28,11 @@ def job():
     # 1. Update Data
     data_loader.update_database()
 
-    # 2. Get Signals
+    # 2. Get Signals (from the local signal service if running, else computed here)
+    client = get_client()
+    client.refresh()
     try:
-        latest = signal_calculator.get_latest_signal()
+        latest = client.latest()
     except Exception as e:
         notifier.notify("Error", f"Failed to calculate signals: {e}")
         return
@@ -41,11 +42,7 @@ def job():
     positions = state.get("positions", [])
     last_buy_price = state.get("last_buy_price")
 
-    # 4. Prepare Decision Engine
-    config = StrategyConfig()
-    engine = DecisionEngine(config)
-
-    # Map Signals
+    # 4. Map Signals
     data_dict = {
         'price': latest['close'],
         'pe_rank_5y': latest['pe_rank_5y'],
@@ -57,7 +54,7 @@ def job():
     }
 
     # 5. Analyze
-    decision, reason = engine.analyze(data_dict, len(positions), last_buy_price)
+    decision, reason = client.decision(len(positions), last_buy_price)
 
     action = "HOLD"
 
@@ -90,6 +87,13 @@ def job():
     def fmt_bool(val):
         return "YES" if val else "NO"
 
+    # Strategy track record (extends yesterday's checkpoint by the new bars)
+    try:
+        perf = performance_tracker.update_performance()
+        perf_msg = f"Strategy (since 2018): Return {perf['return']:.2%}, Sharpe {perf['sharpe']:.2f}, Max DD {perf['drawdown']:.2f}%"
+    except Exception as e:
+        perf_msg = f"Strategy performance unavailable: {e}"
+
     # 7. Notify
     msg = f"""
 Date: {latest.name.date()}
@@ -104,6 +108,8 @@ Positions: {len(positions)}/3
 
 Action: {action}
 Reason: {reason}
+
+{perf_msg}
     """
 
     notifier.notify(f"ChiNext Signal: {action}", msg)
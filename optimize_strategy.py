@@ -1,5 +1,17 @@
 import run_backtest
+import signal_calculator
+import factors
 import itertools
+import argparse
+import json
+from results_archive import ResultsArchive, config_hash, make_run_id
+from strategy import ChiNextStrategy
+from task_queue import TaskQueue, result_from_json
+import robustness
+import pandas as pd
+from constraints import RunConstraints
+from decision_engine import DecisionEngine
+import fast_backtest
 
 # Params to sweep
 # Focused sweep to find a good config quickly
@@ -8,39 +20,247 @@ buy_pes = [0.30, 0.40]
 macros = [True, False]
 norths = [True, False]
 
-best_sharpe = -999
-best_params = {}
-best_result = {}
-
-print("Starting Optimization Loop...")
-
-combinations = list(itertools.product(buy_vols, buy_pes, macros, norths))
-total = len(combinations)
-count = 0
-
-for vol, pe, m, n in combinations:
-    count += 1
-    params = {
-        'buy_vol_threshold': vol,
-        'buy_pe_threshold': pe,
-        'enable_macro_filter': m,
-        'enable_northbound_filter': n
-    }
-
-    # print(f"[{count}/{total}] Testing {params}...")
-    try:
-        res = run_backtest.run_backtest(**params)
-    except Exception as e:
-        print(f"Error with {params}: {e}")
-        continue
-
-    if res['sharpe'] > best_sharpe:
-        best_sharpe = res['sharpe']
-        best_params = params
-        best_result = res
-        print(f"New Best: Sharpe {best_sharpe:.4f}, Return {res['return']:.2%}, Params: {params}")
-
-print("\n=== Optimization Complete ===")
-print(f"Best Sharpe: {best_sharpe:.4f}")
-print(f"Best Return: {best_result.get('return', 0):.2%}")
-print(f"Best Params: {best_params}")
+# Signal windows to sweep (indicator lengths)
+# Each distinct column is computed once and shared by every threshold combination
+# through the factor cache (e.g. ma_windows = [10, 15, 20, 25, 30], pe_windows = [1250, 2500]).
+ma_windows = [20]      # Bias MA length ('ma20')
+pe_windows = [1250]    # PE percentile lookback ('pe_rank_5y')
+
+
+def build_combinations():
+    """Full parameter dicts (strategy defaults + swept values + signal windows)."""
+    strategy_defaults = dict(ChiNextStrategy.params._getpairs())
+    strategy_defaults.pop('constraints')
+    strategy_defaults.pop('execution')
+    combos = []
+    for ma_w, pe_w, vol, pe, m, n in itertools.product(ma_windows, pe_windows, buy_vols, buy_pes, macros, norths):
+        combos.append({
+            **strategy_defaults,
+            'buy_vol_threshold': vol,
+            'buy_pe_threshold': pe,
+            'enable_macro_filter': m,
+            'enable_northbound_filter': n,
+            'signal_windows': {'ma20': ma_w, 'pe_rank_5y': pe_w},
+        })
+    return combos
+
+
+def archive_params(run_params, constraints=None):
+    """
+    Archive key / queue task params of a run. Constrained runs are keyed with
+    their constraints, so a stored (possibly pruned) result is only reused by
+    a sweep with the same constraints.
+    """
+    if constraints is None:
+        return run_params
+    return {**run_params, 'constraints': constraints.to_dict()}
+
+
+def report_pruned(pruned, limit=20):
+    print(f"Pruned {len(pruned)} runs by constraints.")
+    for run_params, info in pruned[:limit]:
+        print(f"  Stopped at {info['date']} (bar {info['bar']}): {info['reason']} | {run_params}")
+    if len(pruned) > limit:
+        print(f"  ... {len(pruned) - limit} more (ResultsArchive().query(include_pruned=True))")
+
+
+def run_local(combinations, data, data_version, constraints=None):
+    """Runs the sweep in this process. Returns list of (params, result) for completed runs."""
+    # Every run is archived (pruned ones with reason and bar); runs already
+    # evaluated on this data version with the same constraints are reused
+    archive = ResultsArchive()
+    results = []
+    pruned = []
+    for count, run_params in enumerate(combinations, 1):
+        params = dict(run_params)
+        windows = params.pop('signal_windows')
+        key = archive_params(run_params, constraints)
+
+        res = archive.get(key, data_version)
+        if res is None:
+            # print(f"[{count}/{len(combinations)}] Testing {params}...")
+            try:
+                res = run_backtest.run_backtest(data=data, signal_windows=windows, constraints=constraints, **params)
+            except Exception as e:
+                print(f"Error with {params}: {e}")
+                continue
+            archive.save(key, data_version, res)
+        if res['pruned']:
+            pruned.append((run_params, res['pruned']))
+            continue
+        results.append((run_params, res))
+    report_pruned(pruned)
+    print(f"Results archived to {archive.db_path} (query with results_archive.py)")
+    archive.close()
+    return results
+
+
+def run_halving(combinations, data, data_version, constraints=None, rungs=(0.25, 0.5, 0.75, 1.0), keep=0.5):
+    """
+    Successive halving on the fast engine: every run steps to the next rung
+    (fraction of the backtest period), constraint violations are pruned on the
+    spot, and only the best `keep` fraction by partial Sharpe continues.
+    Full and constraint-pruned runs are archived (engine 'fast'); ranked-out
+    runs depend on the rest of the sweep and are not.
+
+    Returns:
+        list: (params, result) for completed runs, pruned runs included with
+              result['pruned'] set (reason, date, bar or 'Ranked out at rung').
+    """
+    start = pd.to_datetime(run_backtest.START_DATE)
+    arrays_by_windows = {}
+    runs = []
+    for run_params in combinations:
+        key = json.dumps(run_params['signal_windows'], sort_keys=True)
+        if key not in arrays_by_windows:
+            sig = signal_calculator.calculate_signals(data, windows=run_params['signal_windows'])
+            arrays_by_windows[key] = fast_backtest.to_arrays(sig[sig.index >= start])
+        config = fast_backtest.make_config(run_params)
+        runs.append({'params': run_params, 'arrays': arrays_by_windows[key], 'config': config,
+                     'engine': DecisionEngine(config), 'state': fast_backtest.new_state(), 'pos': 0})
+
+    alive = runs
+    for r, rung in enumerate(rungs):
+        for run in alive:
+            end = int(len(run['arrays']['close']) * rung)
+            run['pos'] = fast_backtest.step(run['state'], run['arrays'], run['engine'], run['config'],
+                                            start=run['pos'], end=end, constraints=constraints)
+        alive = [run for run in alive if not run['state']['pruned']]
+
+        if r < len(rungs) - 1 and len(alive) > 1:
+            # Rank partial results; the rest stops here
+            alive.sort(key=lambda run: fast_backtest.yearly_sharpe(run['state']['year_end']) or -999, reverse=True)
+            n_keep = max(1, int(len(alive) * keep))
+            for run in alive[n_keep:]:
+                run['state']['pruned'] = {'reason': f"Ranked out at rung {rung:.0%}", 'date': None, 'bar': run['pos']}
+                run['ranked_out'] = True
+            alive = alive[:n_keep]
+            print(f"Rung {rung:.0%}: {len(alive)} runs continue")
+
+    pruned = sum(1 for run in runs if run['state']['pruned'])
+    print(f"Halving complete: {len(runs) - pruned} full runs, {pruned} stopped early.")
+
+    archive = ResultsArchive()
+    results = []
+    for run in runs:
+        res = fast_backtest.summarize(run['state'])
+        if not run.get('ranked_out'):
+            archive.save(archive_params(run['params'], constraints), data_version, res, engine='fast')
+        results.append((run['params'], res))
+    print(f"Results archived to {archive.db_path} (query with results_archive.py)")
+    archive.close()
+    return results
+
+
+def run_queue(combinations, data_version, queue_path, enqueue_only=False, constraints=None, engine='backtrader'):
+    """
+    Enqueues the sweep into a shared task queue and waits for workers
+    (python task_queue.py worker <queue>) to finish it. Constraints travel
+    with each task. Runs already archived by `engine` (the workers' --engine)
+    are not enqueued; returned results are archived like local runs.
+    """
+    archive = ResultsArchive()
+    results, pruned = [], []
+
+    def collect(run_params, res):
+        if res['pruned']:
+            pruned.append((run_params, res['pruned']))
+        else:
+            results.append((run_params, res))
+
+    # Task ids include the data version: a re-enqueue after a data update adds new tasks
+    tasks = {}
+    for p in combinations:
+        key = archive_params(p, constraints)
+        res = archive.get(key, data_version, engine=engine)
+        if res is not None:
+            collect(p, res)
+        else:
+            tasks[make_run_id(config_hash(key), data_version)] = (p, key)
+
+    queue = TaskQueue(queue_path)
+    added = queue.enqueue([(tid, key) for tid, (_, key) in tasks.items()], data_version)
+    print(f"Enqueued {added} new tasks ({len(tasks) - added} already queued, "
+          f"{len(combinations) - len(tasks)} archived) into {queue_path}.")
+    if enqueue_only:
+        queue.close()
+        archive.close()
+        return []
+
+    print("Waiting for workers...")
+    counts = queue.wait(data_version=data_version)
+    print(f"Queue drained: {counts}")
+    for tid, _, r in queue.results(data_version):
+        if tid not in tasks:
+            continue
+        run_params, key = tasks[tid]
+        res = result_from_json(r)
+        archive.save(key, data_version, res, engine=res.get('engine', 'backtrader'))
+        collect(run_params, res)
+    queue.close()
+    report_pruned(pruned)
+    print(f"Results archived to {archive.db_path} (query with results_archive.py)")
+    archive.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queue", help="Distribute the sweep through a task queue file")
+    parser.add_argument("--enqueue-only", action="store_true", help="Enqueue tasks and exit (coordinator only)")
+    parser.add_argument("--engine", choices=["backtrader", "fast"], default="backtrader",
+                        help="Engine the queue workers run (task_queue.py worker --engine); archived runs are looked up under it")
+    parser.add_argument("--halving", action="store_true", help="Successive halving on the fast engine (ranks partial runs)")
+    parser.add_argument("--max-dd", type=float, default=30.0, help="Prune runs once drawdown exceeds this %% (0 = off)")
+    parser.add_argument("--min-fills", type=int, default=None, help="Prune runs with fewer executed orders ...")
+    parser.add_argument("--min-fills-by", default=None, help="... by this date (YYYY-MM-DD)")
+    parser.add_argument("--min-equity", type=float, default=None, help="Prune runs whose equity falls below this")
+    parser.add_argument("--paths", type=int, default=1000, help="Bootstrap paths for the robustness check of the best config (0 = skip)")
+    args = parser.parse_args()
+
+    print("Starting Optimization Loop...")
+
+    # Load raw data once for the whole sweep
+    data = signal_calculator.load_data()
+    data_version = factors.data_version(data)
+    combinations = build_combinations()
+    constraints = RunConstraints(
+        max_drawdown=args.max_dd or None,
+        min_fills=args.min_fills,
+        min_fills_by=args.min_fills_by,
+        min_equity=args.min_equity)
+    if constraints.is_empty():
+        constraints = None
+
+    if args.queue:
+        results = run_queue(combinations, data_version, args.queue, args.enqueue_only, constraints, args.engine)
+    elif args.halving:
+        runs = run_halving(combinations, data, data_version, constraints)
+        results = [(p, r) for p, r in runs if not r['pruned']]
+        report_pruned([(p, r['pruned']) for p, r in runs if r['pruned']])
+    else:
+        results = run_local(combinations, data, data_version, constraints)
+
+    best_sharpe = -999
+    best_params = {}
+    best_result = {}
+    for run_params, res in results:
+        if res['sharpe'] > best_sharpe:
+            best_sharpe = res['sharpe']
+            best_params = run_params
+            best_result = res
+            print(f"New Best: Sharpe {best_sharpe:.4f}, Return {res['return']:.2%}, Params: {best_params}")
+
+    print("\n=== Optimization Complete ===")
+    print(f"Best Sharpe: {best_sharpe:.4f}")
+    print(f"Best Return: {best_result.get('return', 0):.2%}")
+    print(f"Best Params: {best_params}")
+    print(f"Signal Cache: {factors.cache_info()}")
+
+    # Robustness of the winner over resampled histories
+    if best_params and args.paths > 0:
+        robustness.report(best_params, n_paths=args.paths, method='block', data=data)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import factors
+import signal_calculator
+from config import StrategyConfig
+from decision_engine import DecisionEngine
+from fast_backtest import new_state, step, summarize, to_arrays, make_config, START_CASH
+from run_backtest import START_DATE
+
+# Live-to-date Performance Tracker
+# Keeps a checkpoint of the strategy replay (cash, position, last buy price, grid count,
+# equity curve, Sharpe/drawdown accumulators) and extends it with new bars only.
+# The checkpoint is rebuilt from START_DATE when the config changes or when rows
+# that were already processed are revised in the database.
+
+PERF_STATE_FILE = "performance_state.json"
+
+TRACKED_COLUMNS = ['pe_rank_5y', 'vol_ratio', 'bias_20', 'ma60', 'bond_trend_down', 'north_inflow_20']
+
+
+def _params_hash(params):
+    return hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def _to_json(checkpoint):
+    state = dict(checkpoint['state'])
+    state['dates'] = [str(d)[:10] for d in state['dates']]
+    state['entry_date'] = str(state['entry_date'])[:10] if state['entry_date'] is not None else None
+    state['trade_list'] = [{**t, 'entry_date': str(t['entry_date'])[:10], 'exit_date': str(t['exit_date'])[:10]}
+                           for t in state['trade_list']]
+    state['year_end'] = {str(y): v for y, v in state['year_end'].items()}
+    return {**checkpoint, 'state': state}
+
+
+def _from_json(checkpoint):
+    state = checkpoint['state']
+    state['dates'] = list(np.array(state['dates'], dtype='datetime64[ns]'))
+    state['year_end'] = {int(y): v for y, v in state['year_end'].items()}
+    state.setdefault('fills', 0)
+    state.setdefault('pruned', None)
+    if state['pending'] is not None:
+        state['pending'] = tuple(state['pending'])
+    return checkpoint
+
+
+def load_checkpoint():
+    if os.path.exists(PERF_STATE_FILE):
+        try:
+            with open(PERF_STATE_FILE, 'r') as f:
+                return _from_json(json.load(f))
+        except Exception as e:
+            print(f"Error loading performance state: {e}. Rebuilding.")
+    return None
+
+
+def save_checkpoint(checkpoint):
+    with open(PERF_STATE_FILE, 'w') as f:
+        json.dump(_to_json(checkpoint), f)
+
+
+def update_performance(df=None, params=None):
+    """
+    Extends the tracked backtest to the latest bar and persists it.
+
+    Args:
+        df (pd.DataFrame, optional): Raw stock_daily frame (loaded if omitted).
+        params (dict, optional): Strategy config (current StrategyConfig if omitted).
+
+    Returns:
+        dict: sharpe, return, drawdown, trades, equity, trade_list, plus
+              as_of (last date), new_bars and rebuilt.
+    """
+    df = df if df is not None else signal_calculator.load_data()
+    params = params if params is not None else StrategyConfig().params
+    windows = params.get('signal_windows')
+    cfg_hash = _params_hash(params)
+
+    # 1. Validate checkpoint: same config, and processed history unchanged
+    checkpoint = load_checkpoint()
+    rebuilt = False
+    if checkpoint is not None:
+        last_date = pd.Timestamp(checkpoint['last_date'])
+        valid = (checkpoint['params_hash'] == cfg_hash
+                 and last_date in df.index
+                 and factors.data_version(df.loc[:last_date]) == checkpoint['history_version'])
+        if not valid:
+            print("Performance state out of date (config changed or history revised). Rebuilding...")
+            checkpoint = None
+
+    if checkpoint is None:
+        rebuilt = True
+        checkpoint = {'params_hash': cfg_hash, 'last_date': None, 'history_version': None, 'state': new_state(START_CASH)}
+
+    # 2. New bars only
+    start = pd.to_datetime(START_DATE)
+    if checkpoint['last_date'] is not None:
+        start = max(start, pd.Timestamp(checkpoint['last_date']) + pd.Timedelta(days=1))
+    new_rows = int((df.index >= start).sum())
+
+    if new_rows > 0:
+        # Signals for the new bars need only the trailing lookback window
+        lookback = factors.lookback(TRACKED_COLUMNS, windows)
+        tail = df.iloc[-(new_rows + lookback):]
+        sig = signal_calculator.calculate_signals(tail, columns=TRACKED_COLUMNS, windows=windows)
+        sig = sig[sig.index >= start]
+
+        config = make_config(params)
+        step(checkpoint['state'], to_arrays(sig), DecisionEngine(config), config)
+
+        checkpoint['last_date'] = str(df.index[-1].date())
+        checkpoint['history_version'] = factors.data_version(df)
+        save_checkpoint(checkpoint)
+
+    result = summarize(checkpoint['state'], START_CASH)
+    result.update({'as_of': checkpoint['last_date'], 'new_bars': new_rows, 'rebuilt': rebuilt})
+    return result
+
+
+if __name__ == "__main__":
+    perf = update_performance()
+    print(f"As of {perf['as_of']} ({perf['new_bars']} new bars{', rebuilt' if perf['rebuilt'] else ''})")
+    print(f"Sharpe: {perf['sharpe']:.4f}")
+    print(f"Return: {perf['return']:.2%}")
+    print(f"Max DD: {perf['drawdown']:.2f}%")
+    print(f"Trades: {perf['trades']}")
@@ -0,0 +1,204 @@
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+# Results Archive
+# Every backtest/sweep run is stored once per (config, data version):
+#   - metadata, parameters and metrics in SQLite (indexed for filtered queries)
+#   - equity curve and trade list in a compressed .npz per run
+#
+# Example: all runs with drawdown < 20% sorted by Sharpe
+#   ResultsArchive().query([('drawdown', '<', 20)], order_by='sharpe')
+
+RESULTS_DB = "results.db"
+CURVE_DIR = "results"
+
+# Strategy parameters stored as their own (indexed) columns
+PARAM_COLUMNS = [
+    'buy_pe_threshold', 'buy_vol_threshold', 'sell_pe_threshold', 'sell_bias_threshold',
+    'grid_drop_pct', 'position_step_pct', 'max_position_pct',
+    'enable_macro_filter', 'enable_northbound_filter',
+]
+METRIC_COLUMNS = ['sharpe', 'return', 'drawdown', 'trades']
+# Runs stopped early by constraints: reason, date and bar where they stopped
+PRUNED_COLUMNS = {'pruned_reason': 'TEXT', 'pruned_date': 'TEXT', 'pruned_bar': 'INTEGER'}
+QUERY_COLUMNS = (['run_id', 'config_hash', 'data_version', 'engine', 'created_at']
+                 + PARAM_COLUMNS + METRIC_COLUMNS + list(PRUNED_COLUMNS))
+OPERATORS = ('<', '<=', '>', '>=', '=', '!=')
+
+
+def config_hash(params, engine='backtrader'):
+    """Stable hash of a run configuration (parameters + engine)."""
+    payload = json.dumps({'params': params, 'engine': engine}, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+
+def make_run_id(cfg_hash, data_version):
+    return hashlib.sha1(f"{cfg_hash}:{data_version}".encode()).hexdigest()[:16]
+
+
+class ResultsArchive:
+    def __init__(self, db_path=RESULTS_DB, curve_dir=CURVE_DIR):
+        self.db_path = db_path
+        self.curve_dir = curve_dir
+        os.makedirs(curve_dir, exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self._init_db()
+
+    def _init_db(self):
+        param_cols = ", ".join(f"{c} REAL" for c in PARAM_COLUMNS)
+        self.conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT PRIMARY KEY,
+                config_hash TEXT, data_version TEXT, engine TEXT, created_at TEXT,
+                params TEXT, {param_cols},
+                sharpe REAL, "return" REAL, drawdown REAL, trades INTEGER
+            )""")
+        # Archives created before pruned runs were recorded
+        existing = {row[1] for row in self.conn.execute("PRAGMA table_info(runs)")}
+        for c, sql_type in PRUNED_COLUMNS.items():
+            if c not in existing:
+                self.conn.execute(f"ALTER TABLE runs ADD COLUMN {c} {sql_type}")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_runs_version ON runs (data_version, config_hash)")
+        for c in PARAM_COLUMNS + METRIC_COLUMNS:
+            self.conn.execute(f'CREATE INDEX IF NOT EXISTS idx_runs_{c} ON runs ("{c}")')
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def get(self, params, data_version, engine='backtrader'):
+        """Metrics of a previously archived run (with 'pruned' as in run results), or None."""
+        run_id = make_run_id(config_hash(params, engine), data_version)
+        df = pd.read_sql("SELECT * FROM runs WHERE run_id = ?", self.conn, params=(run_id,))
+        if df.empty:
+            return None
+        row = df.iloc[0].to_dict()
+        row['pruned'] = None
+        if row.get('pruned_reason') is not None:
+            bar = row['pruned_bar']
+            row['pruned'] = {'reason': row['pruned_reason'], 'date': row['pruned_date'],
+                             'bar': int(bar) if pd.notna(bar) else None}
+        return row
+
+    def has(self, params, data_version, engine='backtrader'):
+        run_id = make_run_id(config_hash(params, engine), data_version)
+        return self.conn.execute("SELECT 1 FROM runs WHERE run_id = ?", (run_id,)).fetchone() is not None
+
+    def save(self, params, data_version, result, engine='backtrader'):
+        """
+        Stores a run (metrics + equity curve + trade list). Runs whose config and
+        data version were already archived are skipped. Runs stopped by constraints
+        (result['pruned']) are stored with their reason, date and bar.
+        Returns the run_id.
+        """
+        cfg_hash = config_hash(params, engine)
+        run_id = make_run_id(cfg_hash, data_version)
+        if self.conn.execute("SELECT 1 FROM runs WHERE run_id = ?", (run_id,)).fetchone():
+            return run_id
+
+        self._save_curve(run_id, result)
+
+        row = {
+            'run_id': run_id,
+            'config_hash': cfg_hash,
+            'data_version': data_version,
+            'engine': engine,
+            'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+            'params': json.dumps(params, sort_keys=True, default=str),
+        }
+        for c in PARAM_COLUMNS:
+            v = params.get(c)
+            row[c] = float(v) if v is not None else None
+        for c in METRIC_COLUMNS:
+            v = result.get(c)
+            row[c] = float(v) if v is not None else None
+        pruned = result.get('pruned') or {}
+        row['pruned_reason'] = pruned.get('reason')
+        row['pruned_date'] = pruned.get('date')
+        row['pruned_bar'] = pruned.get('bar')
+
+        cols = ", ".join(f'"{c}"' for c in row)
+        marks = ", ".join("?" for _ in row)
+        with self.conn:
+            self.conn.execute(f"INSERT OR IGNORE INTO runs ({cols}) VALUES ({marks})", list(row.values()))
+        return run_id
+
+    def _save_curve(self, run_id, result):
+        equity = result.get('equity')
+        trades = result.get('trade_list') or []
+        arrays = {}
+        if equity is not None and len(equity):
+            arrays['equity_date'] = equity.index.to_numpy(dtype='datetime64[ns]')
+            arrays['equity_value'] = equity.to_numpy(dtype=float)
+        arrays['trade_entry'] = np.array([str(t['entry_date']) for t in trades])
+        arrays['trade_exit'] = np.array([str(t['exit_date']) for t in trades])
+        arrays['trade_pnl'] = np.array([t['pnl'] for t in trades], dtype=float)
+        np.savez_compressed(os.path.join(self.curve_dir, f"{run_id}.npz"), **arrays)
+
+    def load_curve(self, run_id):
+        """
+        Returns:
+            tuple: (equity pd.Series, trades pd.DataFrame)
+        """
+        path = os.path.join(self.curve_dir, f"{run_id}.npz")
+        if not os.path.exists(path):
+            return pd.Series(dtype=float), pd.DataFrame()
+        with np.load(path) as z:
+            if 'equity_value' in z:
+                equity = pd.Series(z['equity_value'], index=pd.DatetimeIndex(z['equity_date']), name='value')
+            else:
+                equity = pd.Series(dtype=float)
+            trades = pd.DataFrame({
+                'entry_date': z['trade_entry'],
+                'exit_date': z['trade_exit'],
+                'pnl': z['trade_pnl'],
+            })
+        return equity, trades
+
+    def query(self, filters=None, order_by='sharpe', descending=True, limit=None, data_version=None,
+              include_pruned=False):
+        """
+        Filtered query over archived runs.
+
+        Args:
+            filters (list): (column, operator, value) tuples, e.g. [('drawdown', '<', 20)].
+            order_by (str): Column to sort by.
+            data_version (str, optional): Restrict to one data version.
+            include_pruned (bool): Also return runs stopped early by constraints.
+        """
+        where, args = [], []
+        for col, op, value in filters or []:
+            if col not in QUERY_COLUMNS or op not in OPERATORS:
+                raise ValueError(f"Invalid filter: {col} {op}")
+            where.append(f'"{col}" {op} ?')
+            args.append(value)
+        if data_version is not None:
+            where.append("data_version = ?")
+            args.append(data_version)
+        if not include_pruned:
+            where.append("pruned_reason IS NULL")
+
+        sql = "SELECT * FROM runs"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        if order_by:
+            if order_by not in QUERY_COLUMNS:
+                raise ValueError(f"Invalid order column: {order_by}")
+            sql += f' ORDER BY "{order_by}" {"DESC" if descending else "ASC"}'
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return pd.read_sql(sql, self.conn, params=args)
+
+
+if __name__ == "__main__":
+    archive = ResultsArchive()
+    print("Top runs with Max DD < 20%:")
+    print(archive.query([('drawdown', '<', 20)], order_by='sharpe', limit=10)[
+        ['run_id', 'data_version'] + PARAM_COLUMNS + METRIC_COLUMNS])
+    archive.close()
@@ -0,0 +1,350 @@
+import multiprocessing
+import os
+
+import numpy as np
+import pandas as pd
+
+import signal_calculator
+from decision_engine import DecisionEngine, BUY_INITIAL, BUY_GRID, SELL
+from fast_backtest import make_config, START_CASH, COMMISSION, RISK_FREE_RATE
+from run_backtest import START_DATE
+
+# Robustness Engine
+# Evaluates one config over many resampled histories at once. Paths are built from
+# the stored daily data either by
+#   - 'block': stationary bootstrap (Politis-Romano) of whole days with a long mean
+#     block, so PE valuation regimes - which last years - survive resampling instead
+#     of being reshuffled into many short cycles (and many extra trades). Valuation,
+#     volume, bond and northbound signals are taken from the sampled days (so they
+#     stay mutually consistent); the price path is rebuilt from the sampled daily
+#     returns and its moving averages are recomputed.
+#   - 'start': the real history started at random dates (fixed path length).
+# Path Sharpe: 'start' paths keep their real dates and use calendar-year returns,
+# i.e. the Backtrader-compatible definition the optimizer ranks on. Bootstrapped
+# paths have no calendar, so 'block' uses returns over consecutive PERIOD-bar
+# blocks instead; the report prints the actual-history point estimate computed
+# the same way, which is the number to compare that distribution against.
+# The strategy state (cash, position, last buy, pending order) is a vector over paths
+# and DecisionEngine.analyze_batch decides for all paths per bar.
+
+BLOCK_SIZE = 504             # Mean trading days per bootstrap block (~2 years, PE-regime scale)
+PERIOD = 252                 # Bars per "year" for the path Sharpe ratio ('block' paths)
+CHUNK = 500                  # Paths per vectorized batch
+MAX_PRICE_WINDOW = 60        # Longest price-derived window (ma60)
+
+PATH_COLUMNS = ['close', 'open', 'volume', 'pe_rank_5y', 'vol_ratio', 'bias_20', 'ma60', 'bond_trend_down', 'north_inflow_20']
+
+
+def _rolling_mean_2d(x, window):
+    """Rolling mean along axis 0 of a (T, P) array (NaN for the first window-1 rows)."""
+    out = np.full(x.shape, np.nan)
+    c = np.concatenate((np.zeros((1, x.shape[1])), np.cumsum(x, axis=0)))
+    out[window - 1:] = (c[window:] - c[:-window]) / window
+    return out
+
+
+def block_bootstrap_paths(df, n_paths, length=None, block=BLOCK_SIZE, rng=None, warmup=None):
+    """
+    Builds (T, P) arrays of resampled paths.
+
+    Args:
+        df (pd.DataFrame): Signal frame (calculate_signals output) incl. warmup history.
+        block (int): Mean block length; block lengths are geometric, starts uniform.
+        warmup (pd.DataFrame): Rows before the evaluation start (seed for moving averages).
+    """
+    rng = rng or np.random.default_rng()
+    n = len(df)
+    length = length or n
+
+    # Each bar starts a new block with probability 1/block, else continues the
+    # previous day; blocks wrap circularly over days 1..n-1 (day 0 has no
+    # previous close for its return)
+    new = rng.random((length, n_paths)) < 1.0 / block
+    new[0] = True
+    starts = rng.integers(1, n, size=(length, n_paths))
+    t = np.arange(length)[:, None]
+    block_start = np.maximum.accumulate(np.where(new, t, 0), axis=0)
+    idx = np.take_along_axis(starts, block_start, axis=0) + (t - block_start)
+    idx = 1 + (idx - 1) % (n - 1)
+
+    close = df['close'].to_numpy(dtype=float)
+    open_ = df['open'].to_numpy(dtype=float)
+    ret = close[idx] / close[idx - 1]
+    gap = open_[idx] / close[idx - 1]
+
+    seed = warmup['close'].to_numpy(dtype=float)[-(MAX_PRICE_WINDOW - 1):] if warmup is not None and len(warmup) else np.array([close[0]])
+    base = seed[-1]
+    path_close = base * np.cumprod(ret, axis=0)
+    prev_close = np.vstack((np.full((1, n_paths), base), path_close[:-1]))
+
+    # Price-derived signals recomputed on the synthetic path (warmup-seeded)
+    full = np.vstack((np.repeat(seed[:, None], n_paths, axis=1), path_close))
+    ma20 = _rolling_mean_2d(full, 20)[len(seed):]
+    ma60 = _rolling_mean_2d(full, 60)[len(seed):]
+
+    paths = {
+        'close': path_close,
+        'open': prev_close * gap,
+        'bias_20': (path_close - ma20) / ma20,
+        'ma60': ma60,
+    }
+    for c in ['volume', 'pe_rank_5y', 'vol_ratio', 'bond_trend_down', 'north_inflow_20']:
+        paths[c] = df[c].to_numpy(dtype=float)[idx]
+    return paths
+
+
+def random_start_paths(df, n_paths, length, rng=None):
+    """(T, P) arrays of the real history started at random offsets."""
+    rng = rng or np.random.default_rng()
+    if length > len(df):
+        raise ValueError("Path length exceeds available history")
+    starts = rng.integers(0, len(df) - length + 1, size=n_paths)
+    idx = starts[None, :] + np.arange(length)[:, None]
+    paths = {c: df[c].to_numpy(dtype=float)[idx] for c in PATH_COLUMNS}
+    paths['year'] = df.index.year.to_numpy()[idx]
+    return paths
+
+
+def history_paths(df):
+    """The actual history as a single path (with its calendar years)."""
+    paths = {c: df[c].to_numpy(dtype=float)[:, None] for c in PATH_COLUMNS}
+    paths['year'] = df.index.year.to_numpy()[:, None]
+    return paths
+
+
+def simulate_paths(paths, params=None, cash=START_CASH, commission=COMMISSION, execution=None):
+    """
+    Vectorized replay of the strategy over (T, P) path arrays.
+    Same order/fill rules as fast_backtest.step (next-open fills, margin rejection,
+    optional ExecutionModel applied across all paths at once).
+    With paths['year'] the Sharpe uses calendar-year returns (fast_backtest.yearly_sharpe),
+    otherwise returns over PERIOD-bar blocks.
+
+    Returns:
+        dict of per-path arrays: sharpe, return, drawdown (%), trades
+    """
+    config = make_config(params)
+    engine = DecisionEngine(config)
+    step_pct = config.get('position_step_pct')
+    max_pct = config.get('max_position_pct')
+
+    close = paths['close']
+    open_ = paths['open']
+    T, P = close.shape
+
+    cash_v = np.full(P, float(cash))
+    size = np.zeros(P)
+    last_buy = np.full(P, np.nan)
+    pend = np.zeros(P)          # +n buy n, -n sell n, 0 none
+    order_qty = np.zeros(P)     # Partial buy fills of the pending order (average price)
+    order_val = np.zeros(P)
+    peak = np.full(P, float(cash))
+    max_dd = np.zeros(P)
+    trades = np.zeros(P, dtype=int)
+    years = paths.get('year')
+    # Per-path running moments of the period excess returns
+    prev_end = np.full(P, float(cash))
+    n_periods = np.zeros(P)
+    sum_ex = np.zeros(P)
+    sum_ex2 = np.zeros(P)
+
+    for t in range(T):
+        # 1. Fill pending orders at the open (volume-capped remainders stay pending)
+        if pend.any():
+            if execution is not None:
+                qty, px, costs = execution.execute(np.sign(pend), np.abs(pend), open_[t], paths['volume'][t])
+            else:
+                qty, px = np.abs(pend), open_[t]
+                costs = qty * px * commission
+            rejected = (pend > 0) & (qty * px + costs > cash_v) # Margin
+            buy = (pend > 0) & (qty > 0)
+            cost = qty * px + costs
+            ok = buy & ~rejected
+            cash_v = np.where(ok, cash_v - cost, cash_v)
+            size = np.where(ok, size + qty, size)
+            order_qty = np.where(ok, order_qty + qty, order_qty)
+            order_val = np.where(ok, order_val + qty * px, order_val)
+
+            sell = (pend < 0) & (qty > 0)
+            cash_v = np.where(sell, cash_v + qty * px - costs, cash_v)
+            size = np.where(sell, size - qty, size)
+
+            remaining = np.where(rejected, 0.0, np.sign(pend) * (np.abs(pend) - qty))
+            bought = ok & (remaining == 0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                last_buy = np.where(bought, order_val / order_qty, last_buy)
+            closed = sell & (remaining == 0)
+            last_buy = np.where(closed, np.nan, last_buy)
+            trades += closed
+            order_qty = np.where(remaining == 0, 0.0, order_qty)
+            order_val = np.where(remaining == 0, 0.0, order_val)
+            pend = remaining
+
+        # 2. Mark to market
+        value = cash_v + size * close[t]
+        peak = np.maximum(peak, value)
+        max_dd = np.maximum(max_dd, (peak - value) / peak * 100)
+        if t == T - 1:
+            period_end = np.ones(P, dtype=bool)
+        elif years is not None:
+            period_end = years[t] != years[t + 1]
+        else:
+            period_end = np.full(P, (t + 1) % PERIOD == 0)
+        if period_end.any():
+            excess = value / prev_end - 1 - RISK_FREE_RATE
+            n_periods += period_end
+            sum_ex += np.where(period_end, excess, 0.0)
+            sum_ex2 += np.where(period_end, excess ** 2, 0.0)
+            prev_end = np.where(period_end, value, prev_end)
+
+        # 3. Decide
+        data = {
+            'price': close[t],
+            'pe_rank_5y': paths['pe_rank_5y'][t],
+            'vol_ratio': paths['vol_ratio'][t],
+            'bias_20': paths['bias_20'][t],
+            'ma60': paths['ma60'][t],
+            'bond_trend_down': paths['bond_trend_down'][t],
+            'north_inflow_20': paths['north_inflow_20'][t],
+        }
+        action = engine.analyze_batch(data, (size > 0).astype(int), last_buy)
+
+        free = pend == 0 # Paths still filling an order place no new one
+        sell_now = free & (action == SELL) & (size > 0)
+        pend = np.where(sell_now, -size, pend)
+
+        init = free & (action == BUY_INITIAL) & (paths['pe_rank_5y'][t] > 0)
+        init_size = np.floor((value * step_pct - size * close[t]) / close[t])
+        pos_pct = size * close[t] / value
+        grid = free & (action == BUY_GRID) & (pos_pct < max_pct - 0.01)
+        grid_size = np.floor(value * step_pct / close[t])
+        if execution is not None:
+            init_size = execution.round_lots(init_size)
+            grid_size = execution.round_lots(grid_size)
+        pend = np.where(init & (init_size > 0), init_size, pend)
+        pend = np.where(grid & (grid_size > 0), grid_size, pend)
+        if execution is not None:
+            # Backtrader checks cash on submission, at the signal bar's close
+            new_buy = free & (pend > 0)
+            fill_volume = paths['volume'][min(t + 1, T - 1)]
+            cost = pend * close[t] + execution.costs(1, pend, close[t], fill_volume)
+            pend = np.where(new_buy & (cost > cash_v), 0.0, pend)
+
+    # Mean / population std of the period excess returns (Backtrader's default form)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = sum_ex / n_periods
+        std = np.sqrt(np.maximum(sum_ex2 / n_periods - mean ** 2, 0.0))
+        sharpe = np.where((std > 0) & (n_periods >= 2), mean / std, np.nan)
+
+    return {
+        'sharpe': sharpe,
+        'return': value / cash - 1,
+        'drawdown': max_dd,
+        'trades': trades,
+    }
+
+
+def _simulate_chunk(args):
+    df, warmup, params, method, n_paths, length, seed, execution = args
+    rng = np.random.default_rng(seed)
+    if method == 'block':
+        paths = block_bootstrap_paths(df, n_paths, length, rng=rng, warmup=warmup)
+    else:
+        paths = random_start_paths(df, n_paths, length, rng=rng)
+    return simulate_paths(paths, params, execution=execution)
+
+
+def _evaluation_frame(params, data=None):
+    """Signal frame of the backtest period and the warmup rows before it."""
+    raw = data if data is not None else signal_calculator.load_data()
+    sig = signal_calculator.calculate_signals(raw, windows=params.get('signal_windows'))
+    start = pd.to_datetime(START_DATE)
+    return sig[sig.index >= start], sig[sig.index < start]
+
+
+def point_estimate(params=None, method='block', data=None, execution=None):
+    """
+    Metrics on the actual history, with the Sharpe defined as for `method`'s
+    paths ('start': calendar years as the optimizer; 'block': PERIOD-bar blocks).
+    """
+    params = params or {}
+    df, _ = _evaluation_frame(params, data)
+    paths = history_paths(df)
+    if method == 'block':
+        del paths['year']
+    res = simulate_paths(paths, params, execution=execution)
+    return {k: float(v[0]) for k, v in res.items()}
+
+
+def evaluate(params=None, n_paths=1000, method='block', length=None, seed=0, processes=None, data=None,
+             execution=None):
+    """
+    Runs `params` over `n_paths` resampled paths.
+
+    Args:
+        method (str): 'block' (block bootstrap) or 'start' (random start dates).
+        length (int, optional): Bars per path. Defaults to the full backtest period
+            ('block') or 3/4 of it ('start').
+        execution (ExecutionModel, optional): Realistic fills instead of the flat commission.
+
+    Returns:
+        pd.DataFrame: One row per path with sharpe, return, drawdown, trades.
+    """
+    params = params or {}
+    df, warmup = _evaluation_frame(params, data)
+    if length is None:
+        length = len(df) if method == 'block' else int(len(df) * 0.75)
+
+    # Chunks bound memory; independent seeds per chunk keep results reproducible
+    chunks = []
+    remaining, i = n_paths, 0
+    while remaining > 0:
+        n = min(CHUNK, remaining)
+        chunks.append((df, warmup, params, method, n, length, seed * 100003 + i, execution))
+        remaining -= n
+        i += 1
+
+    if len(chunks) > 1 and (processes is None or processes > 1):
+        with multiprocessing.Pool(min(processes or os.cpu_count(), len(chunks))) as pool:
+            results = pool.map(_simulate_chunk, chunks)
+    else:
+        results = [_simulate_chunk(c) for c in chunks]
+
+    return pd.DataFrame({k: np.concatenate([r[k] for r in results]) for k in results[0]})
+
+
+def summarize(dist, ci=0.90):
+    """Mean, std and central confidence interval per metric."""
+    lo, hi = (1 - ci) / 2, 1 - (1 - ci) / 2
+    return pd.DataFrame({
+        'mean': dist.mean(),
+        'std': dist.std(),
+        f'p{lo * 100:g}': dist.quantile(lo),
+        'median': dist.median(),
+        f'p{hi * 100:g}': dist.quantile(hi),
+    })
+
+
+def report(params=None, n_paths=1000, method='block', data=None, execution=None):
+    dist = evaluate(params, n_paths=n_paths, method=method, data=data, execution=execution)
+    table = summarize(dist)
+    table['actual'] = pd.Series(point_estimate(params, method=method, data=data, execution=execution))
+    lo, hi = table.columns[2], table.columns[4]
+    table['outside'] = (table['actual'] < table[lo]) | (table['actual'] > table[hi])
+    print(f"\n=== Robustness ({method}, {n_paths} paths) ===")
+    if method == 'block':
+        print(f"Sharpe over {PERIOD}-bar blocks (bootstrapped paths have no calendar); "
+              f"'actual' is the real history measured the same way.")
+    print(table.to_string(float_format=lambda x: f"{x:.4f}"))
+    print(f"P(return < 0): {(dist['return'] < 0).mean():.1%}")
+    outside = table.index[table['outside']].tolist()
+    if outside:
+        # The resampled paths do not describe the real history for these metrics
+        print(f"Warning: actual {', '.join(outside)} outside the {lo}-{hi} interval "
+              f"- the resampling does not reproduce the strategy's regime structure.")
+    return table
+
+
+if __name__ == "__main__":
+    from config import StrategyConfig
+    report(StrategyConfig().params)
@@ -1,18 +1,25 @@
 import backtrader as bt
 import pandas as pd
 import signal_calculator
-from strategy import ChiNextStrategy, ChiNextData
+from config import StrategyConfig
+from strategy import ChiNextStrategy, ChiNextData, ExecutionCommission, VolumeFiller
 import datetime
 
-def run_backtest(**kwargs):
+START_DATE = '2018-01-01'
+
+def run_backtest(data=None, signal_windows=None, data_version=None, constraints=None, execution=None, **kwargs):
     # 1. Load Data
+    # `data` lets sweeps load the raw table once; signal columns are served from
+    # the factor cache, so each distinct window is only computed once per sweep.
+    # `data_version` replays the backtest on a past snapshot (see data_versions.py).
     # print("Loading data and calculating signals...")
-    df = signal_calculator.load_data()
-    df = signal_calculator.calculate_signals(df)
+    df = data if data is not None else signal_calculator.load_data(data_version)
+    if signal_windows is None:
+        signal_windows = StrategyConfig().get('signal_windows')
+    df = signal_calculator.calculate_signals(df, windows=signal_windows)
 
     # Filter 2018-Present
-    start_date = '2018-01-01'
-    df = df[df.index >= pd.to_datetime(start_date)]
+    df = df[df.index >= pd.to_datetime(START_DATE)]
 
     if df.empty:
         print("No data for backtest.")
@@ -27,11 +34,18 @@ def run_backtest(**kwargs):
 
     # 4. Add Strategy
     # Pass kwargs to strategy. If kwargs empty, strategy uses its own defaults (or config).
-    cerebro.addstrategy(ChiNextStrategy, **kwargs)
+    # `constraints` (RunConstraints) stops the run at the first violation.
+    # `execution` (ExecutionModel) sizes orders in board lots.
+    cerebro.addstrategy(ChiNextStrategy, constraints=constraints, execution=execution, **kwargs)
 
     # 5. Set Cash
     cerebro.broker.setcash(1000000.0)
-    cerebro.broker.setcommission(commission=0.0003) # Low commission for Index ETF/tracking
+    if execution is not None:
+        # Volume-capped fills, slippage/stamp duty as costs (see execution.py)
+        cerebro.broker.addcommissioninfo(ExecutionCommission(execution=execution, data=data))
+        cerebro.broker.set_filler(VolumeFiller(execution))
+    else:
+        cerebro.broker.setcommission(commission=0.0003) # Low commission for Index ETF/tracking
 
     # 6. Analyzers
     cerebro.addanalyzer(bt.analyzers.SharpeRatio, _name='sharpe')
@@ -56,16 +70,27 @@ def run_backtest(**kwargs):
     # Returns
     strat_return = (cerebro.broker.getvalue() - 1000000.0) / 1000000.0
 
+    # Equity Curve (from daily returns)
+    daily_returns = pd.Series(strat.analyzers.timereturn.get_analysis())
+    equity = (1 + daily_returns).cumprod() * 1000000.0
+    equity.index = pd.to_datetime(equity.index)
+
     # Print only if running as main
     if __name__ == "__main__":
         print(f"Sharpe: {sharpe:.4f}")
         print(f"Return: {strat_return:.2%}")
         print(f"Max DD: {max_dd:.2f}%")
+        if strat.pruned:
+            print(f"Pruned at {strat.pruned['date']}: {strat.pruned['reason']}")
 
     return {
         'sharpe': sharpe,
         'return': strat_return,
-        'drawdown': max_dd
+        'drawdown': max_dd,
+        'trades': len(strat.trade_list),
+        'equity': equity,
+        'trade_list': strat.trade_list,
+        'pruned': strat.pruned
     }
 
 if __name__ == "__main__":
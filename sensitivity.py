@@ -0,0 +1,202 @@
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+
+import numpy as np
+import pandas as pd
+
+import factors
+import signal_calculator
+from config import StrategyConfig
+from fast_backtest import run_fast_backtest
+from run_backtest import START_DATE
+
+# Parameter Sensitivity Surface
+# Precomputes backtest metrics over a dense grid of the dashboard sidebar parameters
+# (fast engine, all cores) and stores them in an indexed SQLite table, so the
+# dashboard can show metrics for the current slider position by lookup/interpolation.
+
+SURFACE_DB = "sensitivity.db"
+
+# Grid covers the sidebar input ranges
+GRID = {
+    'buy_pe_threshold': [round(x, 2) for x in np.arange(0.0, 1.0001, 0.05)],
+    'buy_vol_threshold': [round(x, 2) for x in np.arange(0.0, 2.0001, 0.1)],
+    'grid_drop_pct': [round(x, 2) for x in np.arange(0.01, 0.2001, 0.01)],
+    'enable_macro_filter': [True, False],
+    'enable_northbound_filter': [True, False],
+}
+CONTINUOUS = ['buy_pe_threshold', 'buy_vol_threshold', 'grid_drop_pct']
+METRICS = ['sharpe', 'return', 'drawdown', 'trades']
+
+_worker_df = None
+
+
+def base_config_hash(params):
+    """Hash of every config value that is NOT swept (they shape the whole surface)."""
+    base = {k: v for k, v in params.items() if k not in GRID}
+    return hashlib.sha1(json.dumps(base, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def init_db(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS surface (
+            data_version TEXT, base_hash TEXT,
+            buy_pe_threshold REAL, buy_vol_threshold REAL, grid_drop_pct REAL,
+            enable_macro_filter INTEGER, enable_northbound_filter INTEGER,
+            sharpe REAL, "return" REAL, drawdown REAL, trades INTEGER
+        )""")
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_surface_params ON surface (
+            data_version, base_hash, enable_macro_filter, enable_northbound_filter,
+            buy_pe_threshold, buy_vol_threshold, grid_drop_pct
+        )""")
+
+
+def _init_worker(df):
+    global _worker_df
+    _worker_df = df
+
+
+def _evaluate(params):
+    res = run_fast_backtest(_worker_df, params)
+    metrics = {m: res[m] for m in METRICS}
+    if metrics['sharpe'] == -999:
+        # Undefined (no trades / flat equity): stored as NULL so it does not
+        # swamp the heatmap colour scale or the interpolation in `lookup`
+        metrics['sharpe'] = None
+    return params, metrics
+
+
+def build_surface(processes=None):
+    """Runs the full grid for the current data and base config and stores it."""
+    config = StrategyConfig()
+    df = signal_calculator.load_data()
+    version = factors.data_version(df)
+    base_params = config.params
+    base_hash = base_config_hash(base_params)
+
+    df = signal_calculator.calculate_signals(df, windows=config.get('signal_windows'))
+    df = df[df.index >= pd.to_datetime(START_DATE)]
+
+    keys = list(GRID)
+    combos = [{**base_params, **dict(zip(keys, values))} for values in itertools.product(*GRID.values())]
+    print(f"Building sensitivity surface: {len(combos)} runs (data {version}, base {base_hash})...")
+
+    rows = []
+    with multiprocessing.Pool(processes or os.cpu_count(), initializer=_init_worker, initargs=(df,)) as pool:
+        for i, (params, metrics) in enumerate(pool.imap_unordered(_evaluate, combos, chunksize=32), 1):
+            rows.append((
+                version, base_hash,
+                params['buy_pe_threshold'], params['buy_vol_threshold'], params['grid_drop_pct'],
+                int(params['enable_macro_filter']), int(params['enable_northbound_filter']),
+                metrics['sharpe'], metrics['return'], metrics['drawdown'], metrics['trades'],
+            ))
+            if i % 1000 == 0:
+                print(f"  {i}/{len(combos)}")
+
+    conn = sqlite3.connect(SURFACE_DB)
+    init_db(conn)
+    with conn:
+        conn.execute("DELETE FROM surface WHERE data_version = ? AND base_hash = ?", (version, base_hash))
+        conn.executemany("INSERT INTO surface VALUES (?,?,?,?,?,?,?,?,?,?,?)", rows)
+    conn.close()
+    print(f"Surface saved to {SURFACE_DB}.")
+    return version, base_hash
+
+
+def load_surface(version, base_hash):
+    """Loads one surface as a DataFrame (empty if it was never built)."""
+    if not os.path.exists(SURFACE_DB):
+        return pd.DataFrame()
+    conn = sqlite3.connect(SURFACE_DB)
+    try:
+        init_db(conn)
+        surface = pd.read_sql(
+            "SELECT * FROM surface WHERE data_version = ? AND base_hash = ?",
+            conn, params=(version, base_hash))
+        surface[METRICS] = surface[METRICS].apply(pd.to_numeric) # NULL -> NaN
+        return surface
+    finally:
+        conn.close()
+
+
+def _slice(surface, params):
+    macro = int(bool(params['enable_macro_filter']))
+    north = int(bool(params['enable_northbound_filter']))
+    return surface[(surface['enable_macro_filter'] == macro) & (surface['enable_northbound_filter'] == north)]
+
+
+def lookup(surface, params):
+    """
+    Metrics at an arbitrary slider position: trilinear interpolation over the
+    continuous parameters within the matching (macro, northbound) slice.
+    Corners where a metric is undefined (NaN) are skipped and the remaining
+    weights renormalized, per metric.
+    """
+    sl = _slice(surface, params)
+    if sl.empty:
+        return None
+
+    axes = [np.array(GRID[k]) for k in CONTINUOUS]
+    grid = sl.set_index(CONTINUOUS).sort_index()
+
+    # Bracketing grid points and weights per axis
+    brackets = []
+    for k, axis in zip(CONTINUOUS, axes):
+        x = float(np.clip(params[k], axis[0], axis[-1]))
+        hi = int(min(np.searchsorted(axis, x), len(axis) - 1))
+        lo = max(hi - 1, 0)
+        w = 0.0 if axis[hi] == axis[lo] else (x - axis[lo]) / (axis[hi] - axis[lo])
+        brackets.append(((axis[lo], 1 - w), (axis[hi], w)))
+
+    result = {m: 0.0 for m in METRICS}
+    total_w = {m: 0.0 for m in METRICS}
+    for corner in itertools.product(*brackets):
+        w = np.prod([cw for _, cw in corner])
+        if w == 0:
+            continue
+        key = tuple(round(v, 2) for v, _ in corner)
+        if key not in grid.index:
+            continue
+        row = grid.loc[key]
+        if isinstance(row, pd.DataFrame):
+            row = row.iloc[0]
+        for m in METRICS:
+            if pd.isna(row[m]):
+                continue
+            result[m] += w * row[m]
+            total_w[m] += w
+
+    if not any(total_w.values()):
+        return None
+    return {m: result[m] / total_w[m] if total_w[m] else float('nan') for m in METRICS}
+
+
+def heatmap(surface, params, metric='sharpe', x='buy_pe_threshold', y='buy_vol_threshold'):
+    """Pivot of `metric` over (x, y) at the nearest grid value of the remaining continuous param."""
+    sl = _slice(surface, params)
+    if sl.empty:
+        return pd.DataFrame()
+    for k in CONTINUOUS:
+        if k in (x, y):
+            continue
+        axis = np.array(GRID[k])
+        nearest = axis[np.abs(axis - params[k]).argmin()]
+        sl = sl[np.isclose(sl[k], nearest)]
+    # Undefined cells stay NaN (blank in the heatmap) instead of being dropped
+    return sl.pivot_table(index=y, columns=x, values=metric, dropna=False)
+
+
+def start_background_build():
+    """Launches the surface build as a detached process (used by the dashboard)."""
+    import subprocess
+    return subprocess.Popen([sys.executable, os.path.abspath(__file__)])
+
+
+if __name__ == "__main__":
+    build_surface()
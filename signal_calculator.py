@@ -1,10 +1,20 @@
 import pandas as pd
 import sqlite3
 import numpy as np
+import factors
+from config import StrategyConfig
 
 DB_PATH = "stock_data.db"
 
-def load_data():
+def load_data(version=None):
+    """
+    Loads stock_daily. Pass a data version (see data_versions.py) to get the
+    table exactly as it was at that point in time.
+    """
+    if version is not None:
+        import data_versions
+        return data_versions.reconstruct(version)
+
     conn = sqlite3.connect(DB_PATH)
     df = pd.read_sql("SELECT * FROM stock_daily ORDER BY date ASC", conn)
     conn.close()
@@ -12,41 +22,24 @@ def load_data():
     df.set_index('date', inplace=True)
     return df
 
-def calculate_signals(df):
+def calculate_signals(df, columns=None, windows=None):
     """
     Calculates technical and fundamental signals.
-    """
-    df = df.copy()
-
-    # 1. PE Percentiles (Rolling)
-    # 5 Years approx 1250 trading days
-    # 10 Years approx 2500 trading days
-    # We use min_periods to allow calculation even if we don't have full history at the start
-    df['pe_rank_5y'] = df['pe_ttm'].rolling(window=1250, min_periods=250).rank(pct=True)
-    df['pe_rank_10y'] = df['pe_ttm'].rolling(window=2500, min_periods=250).rank(pct=True)
 
-    # 2. Sentiment: Bias 20
-    df['ma20'] = df['close'].rolling(window=20).mean()
-    df['ma60'] = df['close'].rolling(window=60).mean()
-    df['bias_20'] = (df['close'] - df['ma20']) / df['ma20']
-
-    # 3. Sentiment: Volume Ratio (MA5 / MA60)
-    df['vol_ma5'] = df['volume'].rolling(window=5).mean()
-    df['vol_ma60'] = df['volume'].rolling(window=60).mean()
-    df['vol_ratio'] = df['vol_ma5'] / df['vol_ma60']
-
-    # 4. Macro: Northbound Net Inflow (20 days sum)
-    df['north_inflow_20'] = df['north_net_inflow'].rolling(window=20).sum()
-
-    # 5. Macro: Bond Yield Trend (Current < MA60)
-    df['bond_ma60'] = df['cn10y'].rolling(window=60).mean()
-    df['bond_trend_down'] = df['cn10y'] < df['bond_ma60']
+    Signals are declared in factors.py. Pass `columns` to compute only a subset
+    (and the factors they depend on); by default all live signals are computed.
+    `windows` overrides indicator lengths by column name, e.g. {'ma20': 30}.
+    """
+    return factors.evaluate(df, columns, windows)
 
-    return df
+def current_version():
+    """Data version of stock_daily (recorded head, or content hash if never recorded)."""
+    import data_versions
+    return data_versions.head() or factors.data_version(load_data())
 
 def get_latest_signal():
     df = load_data()
-    df = calculate_signals(df)
+    df = calculate_signals(df, windows=StrategyConfig().get('signal_windows'))
     return df.iloc[-1]
 
 if __name__ == "__main__":
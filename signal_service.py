@@ -0,0 +1,319 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import threading
+from urllib.parse import urlsplit, parse_qs
+
+import pandas as pd
+import requests
+
+import signal_calculator
+from config import StrategyConfig
+from decision_engine import DecisionEngine
+
+# Local Signal Service
+# Holds the latest signal frame in memory and serves it to every consumer
+# (main.job, dashboard sessions, scripts), so N consumers cost one computation.
+#
+#   GET  /latest                                   latest signal row
+#   GET  /history?start=&end=&columns=a,b          signal frame (JSON split, or Arrow)
+#   GET  /decision?config={json}&positions=&last_buy_price=
+#   POST /refresh                                  reload after a data update
+#
+# Responses carry an ETag (data version + request); clients send If-None-Match
+# and get 304 when nothing changed. The service also polls the data version.
+
+HOST = "127.0.0.1"
+PORT = 8765
+POLL_SECONDS = 30
+ARROW_MIME = "application/vnd.apache.arrow.stream"
+
+
+def _py(v):
+    if hasattr(v, 'item'):
+        v = v.item()
+    if isinstance(v, float) and math.isnan(v):
+        return None
+    if isinstance(v, pd.Timestamp):
+        return v.isoformat()
+    return v
+
+
+def row_to_dict(row):
+    return {'date': str(row.name.date()), **{k: _py(v) for k, v in row.items()}}
+
+
+def _etag(*parts):
+    return '"' + hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest()[:20] + '"'
+
+
+class SignalService:
+    def __init__(self):
+        self.version = None
+        self.windows = None
+        self.df = None
+        self._lock = asyncio.Lock()
+        self._decisions = {} # (version, config, positions, last_buy) -> dict
+
+    async def refresh(self, force=False):
+        """Recomputes signals if the data version changed (in a worker thread)."""
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            version = await loop.run_in_executor(None, signal_calculator.current_version)
+            windows = StrategyConfig().get('signal_windows')
+            if version == self.version and windows == self.windows and not force:
+                return False
+            df = await loop.run_in_executor(
+                None, lambda: signal_calculator.calculate_signals(signal_calculator.load_data(), windows=windows))
+            self.df, self.version, self.windows = df, version, windows
+            self._decisions.clear()
+            print(f"Signals refreshed (data version {version}, {len(df)} rows).")
+            return True
+
+    async def poll(self):
+        while True:
+            await asyncio.sleep(POLL_SECONDS)
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"Refresh failed: {e}")
+
+    # --- Handlers: return (status, content_type, body bytes, etag) ---
+
+    def latest(self, query):
+        etag = _etag(self.version, self.windows, 'latest')
+        body = json.dumps({'version': self.version, 'signal': row_to_dict(self.df.iloc[-1])})
+        return 200, "application/json", body.encode(), etag
+
+    def history(self, query, accept, if_none_match=None):
+        start = query.get('start', [None])[0]
+        end = query.get('end', [None])[0]
+        columns = query.get('columns', [None])[0]
+        cols = columns.split(',') if columns else list(self.df.columns)
+        missing = [c for c in cols if c not in self.df.columns]
+        if missing:
+            return 400, "application/json", json.dumps({'error': f"Unknown columns: {missing}"}).encode(), None
+
+        arrow = ARROW_MIME in accept
+        etag = _etag(self.version, self.windows, 'history', start, end, ",".join(cols), arrow)
+        if etag == if_none_match:
+            return 304, "application/json", b"", etag # Skip serialization
+
+        df = self.df.loc[start:end, cols]
+        if arrow:
+            import pyarrow as pa  # Optional dependency
+            sink = pa.BufferOutputStream()
+            table = pa.Table.from_pandas(df)
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            return 200, ARROW_MIME, sink.getvalue().to_pybytes(), etag
+        body = df.to_json(orient='split', date_format='iso', double_precision=15)
+        return 200, "application/json", body.encode(), etag
+
+    def decision(self, query):
+        try:
+            overrides = json.loads(query.get('config', ['{}'])[0] or '{}')
+            positions = int(query.get('positions', ['0'])[0])
+            last_buy = query.get('last_buy_price', [None])[0]
+            last_buy = float(last_buy) if last_buy not in (None, '', 'None') else None
+            config = StrategyConfig()
+            config.params.update(overrides)
+        except (ValueError, TypeError) as e:
+            return 400, "application/json", json.dumps({'error': f"Invalid query: {e}"}).encode(), None
+
+        # Key on the signal frame (version + windows) and the effective config
+        config_key = json.dumps(config.params, sort_keys=True, default=str)
+        key = (self.version, json.dumps(self.windows, sort_keys=True), config_key, positions, last_buy)
+        etag = _etag(*key)
+        if key not in self._decisions:
+            latest = self.df.iloc[-1]
+            data_dict = {
+                'price': latest['close'],
+                'pe_rank_5y': latest['pe_rank_5y'],
+                'vol_ratio': latest['vol_ratio'],
+                'bias_20': latest['bias_20'],
+                'ma60': latest['ma60'],
+                'bond_trend_down': latest['bond_trend_down'],
+                'north_inflow_20': latest['north_inflow_20']
+            }
+            action, reason = DecisionEngine(config).analyze(data_dict, positions, last_buy)
+            self._decisions[key] = {
+                'version': self.version, 'date': str(latest.name.date()),
+                'action': action, 'reason': reason, 'data': {k: _py(v) for k, v in data_dict.items()},
+            }
+        return 200, "application/json", json.dumps(self._decisions[key]).encode(), etag
+
+    # --- HTTP plumbing ---
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode().strip()
+            if not request_line:
+                return
+            method, target, _ = request_line.split(" ", 2)
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode().strip()
+                if not line:
+                    break
+                k, _, v = line.partition(":")
+                headers[k.strip().lower()] = v.strip()
+            if int(headers.get('content-length', 0)):
+                await reader.readexactly(int(headers['content-length']))
+
+            url = urlsplit(target)
+            query = parse_qs(url.query)
+            status, ctype, body, etag = await self.route(method, url.path, query, headers)
+            if etag and headers.get('if-none-match') == etag:
+                status, body = 304, b""
+
+            reason = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error"}[status]
+            head = [f"HTTP/1.1 {status} {reason}", f"Content-Type: {ctype}",
+                    f"Content-Length: {len(body)}", "Connection: close"]
+            if etag:
+                head.append(f"ETag: {etag}")
+            writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + body)
+            await writer.drain()
+        except Exception as e:
+            print(f"Request error: {e}")
+        finally:
+            writer.close()
+
+    async def route(self, method, path, query, headers):
+        try:
+            if method == "POST" and path == "/refresh":
+                changed = await self.refresh(force='force' in query)
+                return 200, "application/json", json.dumps({'version': self.version, 'changed': changed}).encode(), None
+            if self.df is None:
+                await self.refresh()
+            if path == "/latest":
+                return self.latest(query)
+            if path == "/history":
+                return self.history(query, headers.get('accept', ''), headers.get('if-none-match'))
+            if path == "/decision":
+                return self.decision(query)
+            return 404, "application/json", b'{"error": "Not Found"}', None
+        except Exception as e:
+            return 500, "application/json", json.dumps({'error': str(e)}).encode(), None
+
+
+async def serve(host=HOST, port=PORT):
+    service = SignalService()
+    await service.refresh()
+    server = await asyncio.start_server(service.handle, host, port)
+    print(f"Signal service listening on http://{host}:{port}")
+    asyncio.get_running_loop().create_task(service.poll())
+    async with server:
+        await server.serve_forever()
+
+
+class SignalClient:
+    """
+    Thin client with ETag revalidation. Falls back to computing locally
+    when the service is not running, so callers work either way.
+    Use one instance per process (get_client()) so the caches are reused.
+    """
+
+    def __init__(self, base_url=f"http://{HOST}:{PORT}", timeout=5):
+        self.base_url = base_url
+        self.timeout = timeout
+        self._cache = {} # url -> (etag, parsed response)
+        self._local = None # ((data version, windows), signal frame) when the service is down
+        self._lock = threading.Lock()
+
+    def _local_signals(self):
+        """Locally computed signal frame, recomputed only when the data version or windows change."""
+        windows = StrategyConfig().get('signal_windows')
+        key = (signal_calculator.current_version(), json.dumps(windows, sort_keys=True))
+        with self._lock:
+            if self._local is None or self._local[0] != key:
+                df = signal_calculator.calculate_signals(signal_calculator.load_data(), windows=windows)
+                self._local = (key, df)
+            return self._local[1]
+
+    def _get(self, path, params=None, parse=json.loads):
+        req = requests.Request('GET', self.base_url + path, params=params).prepare()
+        headers = {}
+        cached = self._cache.get(req.url)
+        if cached:
+            headers['If-None-Match'] = cached[0]
+        resp = requests.get(req.url, headers=headers, timeout=self.timeout)
+        if resp.status_code == 304 and cached:
+            return cached[1]
+        resp.raise_for_status()
+        value = parse(resp.text)
+        if resp.headers.get('ETag'):
+            self._cache[req.url] = (resp.headers['ETag'], value)
+        return value
+
+    def refresh(self):
+        try:
+            return requests.post(self.base_url + "/refresh", timeout=60).json()
+        except requests.RequestException:
+            return None
+
+    def latest(self):
+        """Latest signal row as a pd.Series named by its date (like get_latest_signal)."""
+        try:
+            sig = dict(self._get("/latest")['signal'])
+        except requests.RequestException:
+            return self._local_signals().iloc[-1]
+        date = pd.Timestamp(sig.pop('date'))
+        return pd.Series({k: (float('nan') if v is None else v) for k, v in sig.items()}, name=date)
+
+    def history(self, start=None, end=None, columns=None):
+        params = {k: v for k, v in {'start': start, 'end': end,
+                                    'columns': ",".join(columns) if columns else None}.items() if v}
+        try:
+            df = self._get("/history", params, parse=lambda text: text)
+        except requests.RequestException:
+            df = self._local_signals()
+            return df.loc[start:end, columns] if columns else df.loc[start:end]
+        from io import StringIO
+        df = pd.read_json(StringIO(df), orient='split')
+        df.index = pd.to_datetime(df.index)
+        df.index.name = 'date'
+        return df
+
+    def decision(self, position_count=0, last_buy_price=None, config=None):
+        """Returns (action, reason) for the latest bar."""
+        params = {'positions': position_count, 'last_buy_price': last_buy_price,
+                  'config': json.dumps(config or {})}
+        try:
+            res = self._get("/decision", params)
+            return res['action'], res['reason']
+        except requests.RequestException:
+            latest = self.latest()
+            cfg = StrategyConfig()
+            cfg.params.update(config or {})
+            data_dict = {
+                'price': latest['close'],
+                'pe_rank_5y': latest['pe_rank_5y'],
+                'vol_ratio': latest['vol_ratio'],
+                'bias_20': latest['bias_20'],
+                'ma60': latest['ma60'],
+                'bond_trend_down': latest['bond_trend_down'],
+                'north_inflow_20': latest['north_inflow_20']
+            }
+            return DecisionEngine(cfg).analyze(data_dict, position_count, last_buy_price)
+
+
+_client = None
+
+
+def get_client():
+    """Process-wide SignalClient (its ETag and fallback caches persist across calls)."""
+    global _client
+    if _client is None:
+        _client = SignalClient()
+    return _client
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local signal/decision service")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port))
@@ -1,6 +1,7 @@
 import backtrader as bt
 from config import StrategyConfig
 from decision_engine import DecisionEngine
+from constraints import pruned_info
 
 # Define the custom data feed to include our pre-calculated signals
 class ChiNextData(bt.feeds.PandasData):
@@ -15,6 +16,34 @@ class ChiNextData(bt.feeds.PandasData):
         ('north_inflow_20', -1),
     )
 
+class ExecutionCommission(bt.CommInfoBase):
+    """
+    Costs of an ExecutionModel for Backtrader: commission, stamp duty and
+    volume-dependent slippage (charged as cost; the fill price stays the open).
+    """
+    params = (
+        ('execution', None),
+        ('data', None),
+        ('stocklike', True),
+        ('commtype', bt.CommInfoBase.COMM_PERC),
+        ('percabs', True),
+    )
+
+    def _getcommission(self, size, price, pseudoexec):
+        volume = self.p.data.volume[0] if self.p.data is not None else 0.0
+        return float(self.p.execution.costs(1 if size > 0 else -1, abs(size), price, volume))
+
+
+class VolumeFiller:
+    """broker.set_filler callable: caps each fill at the model's participation of bar volume."""
+
+    def __init__(self, execution):
+        self.execution = execution
+
+    def __call__(self, order, price, ago):
+        return int(self.execution.cap(abs(order.executed.remsize), order.data.volume[ago]))
+
+
 class ChiNextStrategy(bt.Strategy):
     params = (
         ('buy_pe_threshold', 0.40),
@@ -26,14 +55,18 @@ class ChiNextStrategy(bt.Strategy):
         ('max_position_pct', 0.90),  # Max 90%
         ('enable_macro_filter', True),
         ('enable_northbound_filter', False),
+        ('constraints', None),       # RunConstraints: stop early on violation
+        ('execution', None),         # ExecutionModel: board-lot order sizes
     )
 
     def __init__(self):
         # Initialize Config and Decision Engine
         self.config = StrategyConfig()
         # Override with params (allows optimization)
+        # In memory only: sweeps/workers must not rewrite strategy_config.json
         for p in self.params._getkeys():
-            self.config.set(p, getattr(self.params, p))
+            if p not in ('constraints', 'execution'):
+                self.config.params[p] = getattr(self.params, p)
 
         self.engine = DecisionEngine(self.config)
 
@@ -48,16 +81,21 @@ class ChiNextStrategy(bt.Strategy):
 
         self.last_buy_price = None
         self.order = None
+        self.trade_list = [] # Closed trades (for reporting/archiving)
+        self.fills = 0       # Executed orders (for constraints)
+        self.peak = None
+        self.pruned = None
 
     def log(self, txt, dt=None):
         dt = dt or self.datas[0].datetime.date(0)
         print(f'{dt.isoformat()}, {txt}')
 
     def notify_order(self, order):
-        if order.status in [order.Submitted, order.Accepted]:
-            return
+        if order.status in [order.Submitted, order.Accepted, order.Partial]:
+            return # Partial (volume cap): keep self.order set until the remainder fills
 
         if order.status in [order.Completed]:
+            self.fills += 1
             if order.isbuy():
                 self.log(f'BUY EXECUTED, Price: {order.executed.price:.2f}, Cost: {order.executed.value:.2f}, Comm: {order.executed.comm:.2f}')
                 self.last_buy_price = order.executed.price
@@ -71,7 +109,25 @@ class ChiNextStrategy(bt.Strategy):
             self.log('Order Canceled/Margin/Rejected')
             self.order = None
 
+    def notify_trade(self, trade):
+        if trade.isclosed:
+            self.trade_list.append({
+                'entry_date': bt.num2date(trade.dtopen).date(),
+                'exit_date': bt.num2date(trade.dtclose).date(),
+                'pnl': trade.pnlcomm,
+            })
+
     def next(self):
+        # Constraints (checked every bar, before any new order)
+        if self.params.constraints is not None:
+            value = self.broker.getvalue()
+            self.peak = value if self.peak is None else max(self.peak, value)
+            reason = self.params.constraints.check(self.datas[0].datetime.date(0), value, self.peak, self.fills)
+            if reason:
+                self.pruned = pruned_info(reason, self.datas[0].datetime.date(0), len(self) - 1)
+                self.env.runstop()
+                return
+
         if self.order:
             return
 
@@ -96,13 +152,13 @@ class ChiNextStrategy(bt.Strategy):
         # Execute
         if decision == "SELL":
             self.log(f'SELL SIGNAL: {reason}')
-            self.close()
+            self.order = self.close()
 
         elif decision == "BUY_INITIAL":
             # Check if valid data (sometimes rank is nan at start)
             if self.pe_rank[0] > 0:
                 self.log(f'BUY SIGNAL (Initial): {reason}')
-                self.buy_pct(target=self.params.position_step_pct)
+                self.order = self.buy_pct(target=self.params.position_step_pct)
 
         elif decision == "BUY_GRID":
             # Check Max Position
@@ -112,7 +168,19 @@ class ChiNextStrategy(bt.Strategy):
 
             if pos_pct < self.params.max_position_pct - 0.01:
                 self.log(f'BUY SIGNAL (Grid): {reason}')
-                self.buy(size=int((port_value * self.params.position_step_pct) / self.price[0]))
+                size = int((port_value * self.params.position_step_pct) / self.price[0])
+                if self.params.execution is not None:
+                    size = int(self.params.execution.round_lots(size))
+                if size > 0:
+                    self.order = self.buy(size=size)
 
     def buy_pct(self, target):
-         self.order_target_percent(target=target)
+        if self.params.execution is None:
+            return self.order_target_percent(target=target)
+        # Board lots: buy the missing part of the target, rounded down
+        value = self.broker.getvalue()
+        missing = (value * target - self.position.size * self.price[0]) / self.price[0]
+        size = int(self.params.execution.round_lots(missing))
+        if size > 0:
+            return self.buy(size=size)
+        return None
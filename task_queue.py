@@ -0,0 +1,299 @@
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+# Sweep Task Queue
+# A coordinator enqueues parameter combinations into a SQLite file; any number of
+# workers (processes on this or other hosts sharing the file) claim tasks under a
+# lease, run the backtest and write the metrics back. Tasks whose lease expired
+# (dead worker) are reclaimed by the next claim. No external broker is needed.
+#
+#   python optimize_strategy.py --queue sweep.db --enqueue-only
+#   python task_queue.py worker sweep.db        # start as many as you like
+#   python task_queue.py status sweep.db
+
+DEFAULT_LEASE = 300   # seconds
+MAX_ATTEMPTS = 3
+
+
+class TaskQueue:
+    def __init__(self, path):
+        self.path = path
+        # isolation_level=None: we manage transactions explicitly (BEGIN IMMEDIATE)
+        # Default rollback journal: WAL needs shared memory and breaks when the
+        # queue file lives on a network share used by several hosts.
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                task_id TEXT PRIMARY KEY,
+                data_version TEXT,
+                params TEXT,
+                status TEXT DEFAULT 'pending',   -- pending / running / done / failed
+                worker TEXT,
+                lease_expires REAL,
+                attempts INTEGER DEFAULT 0,
+                result TEXT,
+                error TEXT,
+                updated_at REAL
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status, lease_expires)")
+
+    def close(self):
+        self.conn.close()
+
+    def enqueue(self, tasks, data_version):
+        """
+        Adds tasks. `tasks` is a list of (task_id, params) pairs; ids already in
+        the queue are ignored, so ids must include the data version (see
+        results_archive.make_run_id). Returns the number of new tasks.
+        """
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO tasks (task_id, data_version, params, updated_at) VALUES (?, ?, ?, ?)",
+                [(tid, data_version, json.dumps(p, sort_keys=True, default=str), now) for tid, p in tasks])
+            added = self.conn.total_changes - before
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return added
+
+    def _expire(self, now, max_attempts=MAX_ATTEMPTS):
+        # Expired leases out of attempts (e.g. the task kills its worker) are failed
+        self.conn.execute(
+            """UPDATE tasks SET status = 'failed', error = COALESCE(error, 'Lease expired'), updated_at = ?
+               WHERE status = 'running' AND lease_expires < ? AND attempts >= ?""",
+            (now, now, max_attempts))
+
+    def claim(self, worker, lease=DEFAULT_LEASE, data_version=None, max_attempts=MAX_ATTEMPTS):
+        """
+        Claims one pending task (or a running task whose lease has expired and
+        that has attempts left).
+
+        Returns:
+            tuple: (task_id, params) or None if nothing is claimable.
+        """
+        now = time.time()
+        sql = """
+            SELECT task_id, params FROM tasks
+            WHERE (status = 'pending' OR (status = 'running' AND lease_expires < ? AND attempts < ?))"""
+        args = [now, max_attempts]
+        if data_version is not None:
+            sql += " AND data_version = ?"
+            args.append(data_version)
+        sql += " LIMIT 1"
+
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._expire(now, max_attempts)
+            row = self.conn.execute(sql, args).fetchone()
+            if row is None:
+                self.conn.execute("COMMIT")
+                return None
+            self.conn.execute(
+                "UPDATE tasks SET status = 'running', worker = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ? WHERE task_id = ?",
+                (worker, now + lease, now, row[0]))
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return row[0], json.loads(row[1])
+
+    def heartbeat(self, task_id, worker, lease=DEFAULT_LEASE):
+        """Extends the lease. Returns False if the task is no longer ours."""
+        cur = self.conn.execute(
+            "UPDATE tasks SET lease_expires = ? WHERE task_id = ? AND worker = ? AND status = 'running'",
+            (time.time() + lease, task_id, worker))
+        return cur.rowcount == 1
+
+    def complete(self, task_id, worker, result):
+        cur = self.conn.execute(
+            "UPDATE tasks SET status = 'done', result = ?, error = NULL, updated_at = ? WHERE task_id = ? AND worker = ? AND status = 'running'",
+            (json.dumps(result, default=str), time.time(), task_id, worker))
+        return cur.rowcount == 1
+
+    def fail(self, task_id, worker, error, max_attempts=MAX_ATTEMPTS):
+        """Returns the task to the queue, or marks it failed after max_attempts."""
+        cur = self.conn.execute(
+            """UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                   error = ?, lease_expires = NULL, updated_at = ?
+               WHERE task_id = ? AND worker = ? AND status = 'running'""",
+            (max_attempts, str(error), time.time(), task_id, worker))
+        return cur.rowcount == 1
+
+    def status(self, data_version=None):
+        sql, args = "SELECT status, COUNT(*) FROM tasks", []
+        if data_version is not None:
+            sql, args = sql + " WHERE data_version = ?", [data_version]
+        rows = self.conn.execute(sql + " GROUP BY status", args).fetchall()
+        counts = {'pending': 0, 'running': 0, 'done': 0, 'failed': 0}
+        counts.update(dict(rows))
+        return counts
+
+    def results(self, data_version=None):
+        """List of (task_id, params, result) for finished tasks."""
+        sql, args = "SELECT task_id, params, result FROM tasks WHERE status = 'done'", []
+        if data_version is not None:
+            sql, args = sql + " AND data_version = ?", [data_version]
+        rows = self.conn.execute(sql, args).fetchall()
+        return [(tid, json.loads(p), json.loads(r)) for tid, p, r in rows]
+
+    def wait(self, poll=5, timeout=None, data_version=None):
+        """Blocks until no task (of `data_version`, if given) is pending or running."""
+        start = time.time()
+        while True:
+            with self.conn:
+                self._expire(time.time())
+            counts = self.status(data_version)
+            if counts['pending'] == 0 and counts['running'] == 0:
+                return counts
+            if timeout is not None and time.time() - start > timeout:
+                return counts
+            time.sleep(poll)
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+def _heartbeat_loop(path, task_id, worker, lease, stop):
+    queue = TaskQueue(path)
+    try:
+        while not stop.wait(lease / 3):
+            if not queue.heartbeat(task_id, worker, lease):
+                return
+    finally:
+        queue.close()
+
+
+def run_worker(path, runner, worker=None, lease=DEFAULT_LEASE, data_version=None, poll=2, exit_when_empty=True):
+    """
+    Claims and runs tasks until the queue is drained.
+
+    Args:
+        runner (callable): params -> result dict (JSON serializable).
+        data_version (str, optional): Only claim tasks enqueued for this data version.
+
+    Returns:
+        int: Number of tasks completed by this worker.
+    """
+    worker = worker or default_worker_id()
+    queue = TaskQueue(path)
+    done = 0
+    try:
+        while True:
+            task = queue.claim(worker, lease, data_version)
+            if task is None:
+                counts = queue.status(data_version)
+                if exit_when_empty and counts['pending'] == 0 and counts['running'] == 0:
+                    break
+                # Others may still be running; their tasks become claimable if they die
+                time.sleep(poll)
+                continue
+
+            task_id, params = task
+            stop = threading.Event()
+            hb = threading.Thread(target=_heartbeat_loop, args=(path, task_id, worker, lease, stop), daemon=True)
+            hb.start()
+            try:
+                result = runner(params)
+            except Exception as e:
+                print(f"[{worker}] Task {task_id} failed: {e}")
+                queue.fail(task_id, worker, e)
+                continue
+            finally:
+                stop.set()
+                hb.join()
+
+            if queue.complete(task_id, worker, result):
+                done += 1
+    finally:
+        queue.close()
+    print(f"[{worker}] Finished. Completed {done} tasks.")
+    return done
+
+
+def result_to_json(res, engine):
+    """Backtest result -> JSON-able task result (equity curve and trades included for archiving)."""
+    out = {k: res[k] for k in ('sharpe', 'return', 'drawdown', 'trades', 'pruned')}
+    out['engine'] = engine
+    out['equity'] = {'dates': [str(d)[:10] for d in res['equity'].index], 'values': [float(v) for v in res['equity']]}
+    out['trade_list'] = [{'entry_date': str(t['entry_date'])[:10], 'exit_date': str(t['exit_date'])[:10],
+                          'pnl': float(t['pnl'])} for t in res['trade_list']]
+    return out
+
+
+def result_from_json(result):
+    """Inverse of result_to_json (equity back to a pd.Series) for ResultsArchive.save."""
+    import pandas as pd
+    result = dict(result)
+    equity = result.get('equity') or {'dates': [], 'values': []}
+    result['equity'] = pd.Series(equity['values'], index=pd.DatetimeIndex(equity['dates']), name='value', dtype=float)
+    result.setdefault('trade_list', [])
+    return result
+
+
+def backtest_runner(engine='backtrader'):
+    """
+    Runner that evaluates a params dict on the local database. An optional
+    'constraints' entry (RunConstraints.to_dict()) stops the run early.
+    """
+    import signal_calculator
+    import run_backtest
+    from constraints import RunConstraints
+
+    data = signal_calculator.load_data()
+
+    def runner(params):
+        params = dict(params)
+        windows = params.pop('signal_windows', None)
+        constraints = params.pop('constraints', None)
+        constraints = RunConstraints(**constraints) if constraints else None
+        if engine == 'fast':
+            import pandas as pd
+            from fast_backtest import run_fast_backtest
+            df = signal_calculator.calculate_signals(data, windows=windows)
+            df = df[df.index >= pd.to_datetime(run_backtest.START_DATE)]
+            res = run_fast_backtest(df, params, constraints=constraints)
+        else:
+            res = run_backtest.run_backtest(data=data, signal_windows=windows, constraints=constraints, **params)
+        return result_to_json(res, engine)
+
+    return runner, data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep task queue")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    w = sub.add_parser("worker", help="Claim and run tasks")
+    w.add_argument("queue")
+    w.add_argument("--engine", choices=["backtrader", "fast"], default="backtrader")
+    w.add_argument("--lease", type=int, default=DEFAULT_LEASE)
+    w.add_argument("--wait", action="store_true", help="Keep polling when the queue is empty")
+
+    s = sub.add_parser("status", help="Show task counts")
+    s.add_argument("queue")
+
+    args = parser.parse_args()
+    if args.command == "worker":
+        import factors
+        runner, data = backtest_runner(args.engine)
+        run_worker(args.queue, runner, lease=args.lease, data_version=factors.data_version(data),
+                   exit_when_empty=not args.wait)
+    else:
+        queue = TaskQueue(args.queue)
+        print(queue.status())
+        queue.close()
+
+
+if __name__ == "__main__":
+    main()